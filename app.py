@@ -1,44 +1,84 @@
 # IMPORTS
 import json
-import requests
 import streamlit as st
 from streamlit_option_menu import option_menu
 from streamlit_lottie import st_lottie
 import pandas as pd
-from io import StringIO
-from pycaret.clustering import setup, create_model, assign_model, plot_model
-import matplotlib.pyplot as plt
-import time
-import datetime
-from openai import OpenAI 
 import os
-from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import cm
-from reportlab.pdfbase.pdfmetrics import stringWidth
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-import platform
-import re
+import hashlib
+import tempfile
+from functools import partial
+from llm import (
+    LLM_MODEL,
+    description_tasks,
+    generate_campaign,
+    stream_campaign,
+    run_concurrently,
+    stream_concurrently
+)
+from llm_cache import get_llm_cache
+from llm_gateway import get_llm_gateway
+from lottie_assets import LOTTIE_REDUCED_MOTION, LOTTIE_VARIANT, PAGE_ASSET_BUDGET_KB, get_lottie_assets
+from metrics import get_metrics, memory_report
+from openai_pool import get_openai_pool
+from clustering import (
+    CLUSTERING_ENGINE,
+    GROUP_COLUMN,
+    SAMPLE_SIZE,
+    GROUP_NAME_COLUMN,
+    FittedPipeline,
+    appended_rows,
+    clustering_for_candidate,
+    dataframe_fingerprint,
+    fit_clustering,
+    fit_k_candidates,
+    pycaret_available,
+    row_hashes,
+    update_clustering
+)
+from k_sweep import elbow_k, recommend_k
+from profiling import PROFILE_TOKEN_BUDGET, profile_groups
+from ingestion import DataBudgetError, read_csv_budgeted, read_csv_text
+from preview import PAGE_SIZES, PREVIEW_PAGE_SIZE, page_count, preview_page
+from pdf_export import export_campaign_to_pdf, export_campaigns_to_pdf, write_campaigns_zip
+from projects import Project, list_projects, project_exists, project_id_from_name, save_project, user_projects_dir
+from visualization import VIS_MAX_POINTS, cluster_projection, cluster_scatter, group_sizes_png, model_fingerprint
 
 # LOTTIE ANIMATIONS - funkcja do responsywnych animacji
-def display_lottie_responsive(lottie_animation, key_suffix="", speed=1, quality="medium", loop=True, reverse=False, height_ratio=0.4):
+def display_lottie_responsive(name, key_suffix="", speed=1, quality="medium", loop=True, reverse=False, height_ratio=0.4):
     """
-    Wyświetla animację Lottie w sposób responsywny
+    Wyświetla animację Lottie (images/<name>.json) w sposób responsywny
     height_ratio: stosunek wysokości do szerokości (domyślnie 0.4 = 40% szerokości)
+    Animacja wczytywana jest dopiero na stronie, która jej używa. Przy ograniczonym ruchu pokazywana jest
+    jedna klatka, a animacje przekraczające budżet rozmiaru strony są pomijane.
     """
+    variant = "static" if st.session_state.get("reduced_motion", LOTTIE_REDUCED_MOTION) else LOTTIE_VARIANT
+    assets = get_lottie_assets()
+    size = assets.size(name, variant, loop=loop)
+    used = st.session_state.get("page_asset_bytes", 0)
+    if used and used + size > PAGE_ASSET_BUDGET_KB * 1024:
+        return
+    st.session_state["page_asset_bytes"] = used + size
+
     st_lottie(
-        lottie_animation, 
+        assets.get(name, variant, loop=loop), 
         speed=speed, 
         width=None,  # None oznacza auto-width (100% kontenera)
         height=400,  # Stała wysokość, ale można dostosować
         key=key_suffix, 
         quality=quality, 
-        loop=loop, 
+        loop=loop and variant != "static", 
         reverse=reverse
     )
 
+def show_animation_settings():
+    # Bez klucza widżetu - wartość przetrwa przejście na stronę, na której przełącznika nie ma
+    st.session_state["reduced_motion"] = st.sidebar.toggle(
+        "🎞️ Ogranicz animacje",
+        value=st.session_state.get("reduced_motion", LOTTIE_REDUCED_MOTION),
+        help="Zamiast animacji pokazywana jest jedna klatka - mniej ruchu na ekranie i szybsze wczytywanie strony."
+    )
+
 # PAGE CONFIG
 st.set_page_config(
     page_title="Zaplanuj.to",
@@ -46,26 +86,190 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
-# LOTTIE ANIMATIONS
-@st.cache_data
-def load_lottiefile(filepath: str):
-    with open(filepath, "r") as f:
-        return json.load(f)
-
-lottie_a1 = load_lottiefile("images/a1.json")
-lottie_a2 = load_lottiefile("images/a2.json")
-lottie_a3 = load_lottiefile("images/a3.json")
-lottie_a4 = load_lottiefile("images/a4.json")
-lottie_a5 = load_lottiefile("images/a5.json")
+
+# ---DATA INGESTION---
+@st.cache_resource(max_entries=4, show_spinner="Wczytywanie danych...")
+def load_uploaded_csv(_uploaded_file, file_id: str):
+    """Parsowanie pliku raz na przesłanie (file_id), a nie przy każdym rerunie"""
+    with get_metrics().measure("ingestion"):
+        return read_csv_budgeted(_uploaded_file, size_bytes=_uploaded_file.size)
+
+def show_ingest_report(report: dict):
+    rows = f"{report['rows']:,}".replace(",", " ")
+    if report["truncated"]:
+        max_rows = f"{report['max_rows']:,}".replace(",", " ")
+        st.warning(f"⚠️ Dane przekraczają limit {max_rows} wierszy – wczytano tylko pierwsze {rows}.")
+    st.sidebar.caption(f"📄 {rows} wierszy × {report['columns']} kolumn, {report['memory_bytes'] / 1024 / 1024:.1f} MB w pamięci")
+
+# ---CLUSTERING CACHE---
+@st.cache_resource(max_entries=8, show_spinner="Trenuję model klastrowania...")
+def cached_clustering(_df: pd.DataFrame, fingerprint: str, num_groups: int, normalize: bool = True, session_id: int = 42, sample_size: int = None,
+                      engine: str = CLUSTERING_ENGINE):
+    """
+    Trenuje model K-means i przypisuje grupy. Wynik trzymany jest w ograniczonym cache LRU,
+    którego kluczem jest odcisk danych (_df nie jest hashowany przez Streamlit) i parametry modelu.
+    """
+    with get_metrics().measure("clustering", engine=engine):
+        return fit_clustering(_df, num_groups, normalize=normalize, session_id=session_id, sample_size=sample_size, engine=engine)
+
+K_SWEEP_MAX = int(os.getenv("ZAPLANUJ_K_SWEEP_MAX", "20"))
+
+@st.cache_resource(max_entries=4, show_spinner="Porównuję modele dla różnej liczby grup...")
+def cached_k_sweep(_df: pd.DataFrame, fingerprint: str, k_values: tuple, normalize: bool = True, session_id: int = 42, sample_size: int = None,
+                   engine: str = CLUSTERING_ENGINE):
+    """Modele dla wszystkich k z przeglądu - zmiana liczby grup nie wymaga ponownego trenowania"""
+    with get_metrics().measure("clustering.k_sweep", engine=engine):
+        return fit_k_candidates(_df, k_values, normalize=normalize, session_id=session_id, sample_size=sample_size, engine=engine)
+
+@st.cache_resource(max_entries=16, show_spinner="Przypisuję grupy...")
+def cached_candidate_clustering(_experiment, _model, _df: pd.DataFrame, fingerprint: str, num_groups: int, normalize: bool = True, session_id: int = 42,
+                                sample_size: int = None, engine: str = CLUSTERING_ENGINE):
+    """Dane z grupami dla wybranego modelu z przeglądu k (klucz jak w cached_k_sweep plus k)"""
+    with get_metrics().measure("clustering.assign"):
+        return clustering_for_candidate(_experiment, _model, _df)
+
+# ---VISUALIZATION CACHE---
+@st.cache_resource(max_entries=16, show_spinner="Przygotowuję wykres grup...")
+def cached_cluster_figure(_experiment, _model, model_key: str, max_points: int = VIS_MAX_POINTS):
+    """Rzut PCA i wykres liczone raz na dopasowany model - rerun bez zmiany modelu nie przelicza niczego"""
+    projection, total_points = cluster_projection(_experiment, _model, max_points=max_points)
+    return cluster_scatter(projection, total_points)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def cached_group_sizes_png(sizes: tuple) -> bytes:
+    return group_sizes_png(dict(sizes))
+
+# ---DATA PREVIEW---
+@st.cache_resource(max_entries=32, show_spinner=False)
+def cached_preview_page(_df: pd.DataFrame, data_key: str, page: int, page_size: int, columns: tuple, groups: tuple, group_names: tuple = None):
+    """Strona podglądu (tabela Arrow albo DataFrame, tylko do odczytu - może być współdzielona); przewijanie nie przelicza odwiedzonych stron"""
+    return preview_page(_df, page, page_size, columns, groups, dict(group_names) if group_names is not None else None)
+
+def show_data_preview(frame: pd.DataFrame, key: str, data_key: str, group_names: dict = None):
+    """
+    Podgląd danych stronami: do przeglądarki wysyłana jest tylko bieżąca strona wybranych kolumn,
+    więc koszt nie zależy od liczby wierszy. Dla danych z grupami (group_names) można filtrować po grupie.
+    """
+    columns = list(frame.columns) + ([GROUP_NAME_COLUMN] if group_names is not None else [])
+    col1, col2 = st.columns(2)
+    with col1:
+        selected_columns = st.multiselect("Kolumny", columns, key=f"{key}_columns", placeholder="Wszystkie")
+    with col2:
+        page_size = st.selectbox("Wierszy na stronie", PAGE_SIZES, index=PAGE_SIZES.index(PREVIEW_PAGE_SIZE), key=f"{key}_page_size")
+    selected_groups = []
+    if group_names is not None:
+        groups = sorted(frame[GROUP_COLUMN].unique())
+        selected_groups = st.multiselect(
+            "Grupy", groups, key=f"{key}_groups", placeholder="Wszystkie",
+            format_func=lambda group: f"{group} – {group_names[group]}" if group_names.get(group) else group
+        )
+
+    page = st.session_state.get(f"{key}_page", 1)
+    names = tuple(sorted(group_names.items())) if group_names is not None else None
+    table, rows = cached_preview_page(frame, data_key, page, page_size, tuple(selected_columns), tuple(selected_groups), names)
+    pages = page_count(rows, page_size)
+    if page > pages:
+        # Po zawężeniu filtra strona mogła wyjść poza zakres - wyświetlana jest ostatnia
+        st.session_state[f"{key}_page"] = page = pages
+
+    st.dataframe(table)
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        st.number_input("Strona", min_value=1, max_value=pages, step=1, key=f"{key}_page", label_visibility="collapsed")
+    with col2:
+        first = (page - 1) * page_size + 1 if rows else 0
+        st.caption(f"Strona {page} z {pages} · wiersze {first}–{min(page * page_size, rows)} z {rows:,}".replace(",", " "))
+
+# ---PROJECTS---
+@st.cache_resource(max_entries=4)
+def load_project(projects_dir: str, project_id: str, saved_at: str) -> Project:
+    """Zapisany projekt współdzielony między sesjami tego samego użytkownika; saved_at unieważnia wpis po ponownym zapisie"""
+    return Project(project_id, projects_dir)
+
+def open_project(project: Project):
+    """Ustawia sesję tak, jakby segmentacja i teksty projektu zostały właśnie wygenerowane (bez trenowania i bez LLM)"""
+    for key in list(st.session_state.keys()):
+        if key.startswith(("name_", "description_", "campaign_", "edit_name_", "edit_desc_", "pdf_requested_")):
+            del st.session_state[key]
+    for group, texts in project.texts.items():
+        for field in ("name", "description", "campaign"):
+            if texts.get(field):
+                st.session_state[f"{field}_{group}"] = texts[field]
+
+    st.session_state.open_project = project.project_id
+    st.session_state.auto_groups = False
+    st.session_state.num_groups = project.meta["num_groups"]
+    st.session_state.campaign_goal = project.meta["campaign_goal"]
+    st.session_state.start_generation = True
+    st.session_state.segmentation_base = {
+        "fingerprint": dataframe_fingerprint(project.data),
+        "num_groups": project.meta["num_groups"],
+        "columns": list(project.data.columns),
+        "row_hashes": project.row_hashes,
+        "experiment": project.experiment,
+        "model": project.model,
+        "clustered_df": project.clustered_df,
+        "drift": None,
+        "project_id": project.project_id
+    }
+
+# ---PDF EXPORT---
+@st.cache_data(max_entries=64, show_spinner="Przygotowuję PDF...")
+def campaign_pdf_bytes(title: str, campaign: str) -> bytes:
+    """PDF kampanii zapamiętany w ograniczonym cache - klucz to skrót (tytuł, treść)"""
+    with get_metrics().measure("pdf"):
+        return export_campaign_to_pdf(title, campaign).getvalue()
+
+@st.cache_data(max_entries=8, show_spinner="Przygotowuję zbiorczy PDF...")
+def campaigns_pdf_bytes(campaigns: tuple) -> bytes:
+    """Wszystkie kampanie w jednym PDF ze spisem treści (campaigns: ((tytuł, treść, nazwa pliku), ...))"""
+    with get_metrics().measure("pdf.combined"):
+        return export_campaigns_to_pdf([(title, campaign) for title, campaign, _ in campaigns]).getvalue()
+
+EXPORT_DIR = os.path.join(".cache", "exports")
+EXPORT_MAX_FILES = 8
+
+def campaigns_zip_path(campaigns: tuple, clustered_df: pd.DataFrame, data_fingerprint: str) -> str:
+    """
+    Ścieżka do ZIP-a z PDF-ami grup i CSV z przypisaniami. Archiwum zapisywane jest strumieniowo na dysk
+    (adresowane treścią, więc niezmienione kampanie nie są renderowane ponownie).
+    """
+    export_hash = hashlib.sha256(json.dumps([campaigns, data_fingerprint]).encode("utf-8")).hexdigest()[:16]
+    path = os.path.join(EXPORT_DIR, f"kampanie_{export_hash}.zip")
+
+    if not os.path.exists(path):
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        # Unikalny plik tymczasowy - sesje eksportujące te same kampanie nie piszą do jednego pliku
+        with tempfile.NamedTemporaryFile(dir=EXPORT_DIR, prefix="kampanie_", suffix=".part", delete=False) as tmp_file:
+            tmp_path = tmp_file.name
+        try:
+            with st.spinner("Przygotowuję archiwum ZIP..."), get_metrics().measure("pdf.zip"):
+                write_campaigns_zip(tmp_path, campaigns, clustered_df, render_pdf=campaign_pdf_bytes)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        # Zostawiamy tylko kilka ostatnich archiwów. Katalog jest wspólny dla sesji - plik mógł zniknąć
+        # (usunięty przez inną sesję) między listowaniem a odczytem lub usunięciem
+        exports = []
+        for entry in os.scandir(EXPORT_DIR):
+            if entry.name.endswith(".zip"):
+                try:
+                    exports.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+        for _, old_export in sorted(exports, reverse=True)[EXPORT_MAX_FILES:]:
+            try:
+                os.remove(old_export)
+            except FileNotFoundError:
+                pass
+
+    return path
 
 # ---API INPUT---
 def verify_api_key(key: str) -> bool:
-    try:
-        openai_client = OpenAI(api_key=key)
-        openai_client.models.list()
-        return True
-    except Exception:
-        return False
+    return get_openai_pool().verify(key, LLM_MODEL)
     
 if "openai_api_key" not in st.session_state:
     st.session_state["openai_api_key"] = ""
@@ -85,8 +289,7 @@ if not st.session_state["openai_api_key"]:
                 if user_api_key:
                     if verify_api_key(user_api_key):
                         st.session_state["openai_api_key"] = user_api_key
-                        st.success("✅ Klucz API poprawny.")
-                        time.sleep(3)
+                        st.toast("✅ Klucz API poprawny.")
                         st.rerun()
                     else:
                         st.error("❌ Nieprawidłowy klucz API.")
@@ -106,8 +309,7 @@ if not st.session_state["openai_api_key"]:
                     if admin_user == admin_username and admin_pass == admin_password:
                         st.session_state["openai_api_key"] = st.secrets["openai_api_key"]
                         st.session_state["is_admin"] = True
-                        st.success("✅ Zalogowano jako administrator.")
-                        time.sleep(3)
+                        st.toast("✅ Zalogowano jako administrator.")
                         st.rerun()
                     else:
                         st.error("❌ Nieprawidłowe dane.")
@@ -122,6 +324,70 @@ def show_user_role():
         unsafe_allow_html=True
     )
 
+def show_llm_cache_stats():
+    llm_cache = get_llm_cache()
+    if st.session_state.get("is_admin", False) and llm_cache is not None:
+        stats = llm_cache.stats()
+        st.sidebar.caption(
+            f"🗄️ Cache LLM: {stats['hits']} trafień / {stats['misses']} chybień, "
+            f"{stats['entries']} wpisów ({stats['bytes'] / 1024:.0f} KB)"
+        )
+
+def show_metrics_panel():
+    """Panel administratora: czasy, tokeny, koszt, ponowienia i trafienia w cache dla etapów (wspólne dla procesu)"""
+    if not st.session_state.get("is_admin", False):
+        return
+
+    metrics = get_metrics()
+    with st.sidebar.expander("📈 Metryki wydajności"):
+        summary = metrics.summary()
+        if not summary:
+            st.caption("Brak pomiarów.")
+            return
+
+        st.dataframe(
+            pd.DataFrame(summary).set_index("stage").rename(columns={
+                "calls": "Wywołania",
+                "errors": "Błędy",
+                "cache_hits": "Cache",
+                "coalesced": "Połączone",
+                "retries": "Ponowienia",
+                "prompt_tokens": "Tokeny (prompt)",
+                "completion_tokens": "Tokeny (odp.)",
+                "cost_usd": "Koszt [USD]",
+                "total_s": "Suma [s]",
+                "avg_s": "Średnio [s]",
+                "p50_s": "p50 [s]",
+                "p95_s": "p95 [s]"
+            }),
+            use_container_width=True
+        )
+        gateway = get_llm_gateway().stats
+        st.caption(
+            f"OpenAI: {gateway['requests']} prób, {gateway['rate_limited']} odpowiedzi 429, "
+            f"{gateway['coalesced']} połączonych zapytań, wstrzymanie przez limity: {gateway['throttled_s']:.1f} s"
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("JSONL", metrics.to_jsonl(), file_name="metryki.jsonl", mime="application/x-ndjson", on_click="ignore")
+        with col2:
+            st.download_button("Prometheus", metrics.to_prometheus(), file_name="metryki.prom", mime="text/plain", on_click="ignore")
+        if st.button("Wyczyść metryki"):
+            metrics.reset()
+
+def show_session_memory(objects: dict):
+    """Panel administratora: pamięć danych sesji (kolumny współdzielone przez kilka obiektów liczone są raz)"""
+    if not st.session_state.get("is_admin", False):
+        return
+
+    report = memory_report(objects)
+    with st.sidebar.expander("🧠 Pamięć sesji"):
+        st.dataframe(
+            pd.DataFrame(report).set_index("object").rename(columns={"total_mb": "Łącznie [MB]", "own_mb": "Własne [MB]"}),
+            use_container_width=True
+        )
+        st.caption(f"Razem: {sum(row['own_mb'] for row in report):.1f} MB")
+
 selected = option_menu(
     menu_title="Zaplanuj.to",
     options=["Główna", "Generator", "Kontakt"],
@@ -145,9 +411,13 @@ selected = option_menu(
     }
 )
 
+# Budżet rozmiaru animacji liczony od nowa przy każdym renderowaniu strony
+st.session_state["page_asset_bytes"] = 0
+
 # ---MAIN PAGE---
 if selected == "Główna":
     show_user_role()
+    show_animation_settings()
     
     col1, col2 = st.columns([1, 1], gap="small", vertical_alignment="center")
     
@@ -172,14 +442,14 @@ if selected == "Główna":
 
     
     with col2:
-        display_lottie_responsive(lottie_a1, key_suffix="main_1", speed=1, height_ratio=0.5)
+        display_lottie_responsive("a1", key_suffix="main_1", speed=1, height_ratio=0.5)
     
     st.markdown("""---""")
 
     col1, col2 = st.columns([1, 1], gap="small", vertical_alignment="center")
 
     with col1:
-        display_lottie_responsive(lottie_a2, key_suffix="main_2", speed=1, loop=False, height_ratio=0.5)
+        display_lottie_responsive("a2", key_suffix="main_2", speed=1, loop=False, height_ratio=0.5)
 
     with col2:
         st.markdown("""
@@ -239,7 +509,7 @@ if selected == "Główna":
         """, unsafe_allow_html=True)
     
     with col2:
-        display_lottie_responsive(lottie_a3, key_suffix="main_3", speed=100, height_ratio=0.5)
+        display_lottie_responsive("a3", key_suffix="main_3", speed=100, height_ratio=0.5)
 
 
 
@@ -248,7 +518,7 @@ if selected == "Generator":
     show_user_role()
     
     st.sidebar.subheader("1. Wczytaj dane kampanii")
-    data_source = st.sidebar.radio("Wybierz metodę przesyłania danych:", ["📁 Prześlij plik CSV", "📋 Wklej dane ręcznie"] )
+    data_source = st.sidebar.radio("Wybierz metodę przesyłania danych:", ["📁 Prześlij plik CSV", "📋 Wklej dane ręcznie", "💾 Otwórz zapisany projekt"] )
 
     df = None
 
@@ -256,105 +526,259 @@ if selected == "Generator":
         uploaded_file = st.file_uploader("Prześlij plik CSV", type=["csv"])
         if uploaded_file is not None:
             try:
-                df = pd.read_csv(uploaded_file)
+                df, ingest_report = load_uploaded_csv(uploaded_file, uploaded_file.file_id)
+                show_ingest_report(ingest_report)
+            except DataBudgetError as e:
+                st.error(f"❌ Plik jest zbyt duży: {e}")
             except Exception as e:
                 st.error(f"Wystąpił błąd podczas wczytywania pliku: {e}")
 
     elif data_source == "📋 Wklej dane ręcznie":
         raw_text = st.text_area("Wklej dane CSV (z nagłówkiem)", height=200, placeholder="przyklad : \nimie,wartosc\nAnna,100\nJan,200")
 
+        # Wczytane dane zostają w sesji, dopóki tekst się nie zmieni - przyciski niżej (PDF, eksport, zapis projektu)
+        # wywołują rerun, w którym "Wczytaj dane" nie jest kliknięty
+        text_hash = hashlib.sha256(raw_text.encode("utf-8")).hexdigest()
         if st.button("Wczytaj dane"):
+            st.session_state.pop("pasted_data", None)
             if raw_text.strip():
                 try:
-                    df = pd.read_csv(StringIO(raw_text))
-                    with st.sidebar:
-                        with st.spinner("Wczytywanie danych..."):
-                            time.sleep(3)
+                    with get_metrics().measure("ingestion"):
+                        pasted_df, ingest_report = read_csv_text(raw_text)
+                    st.session_state["pasted_data"] = {"text_hash": text_hash, "df": pasted_df, "report": ingest_report}
+                except DataBudgetError as e:
+                    st.error(f"❌ Wklejone dane są zbyt duże: {e}")
                 except Exception as e:
                     st.error(f"Błąd przy wczytywaniu danych: {e}")
                     
             else:
                 st.warning("Wprowadź dane przed kliknięciem przycisku.")
 
+        pasted = st.session_state.get("pasted_data")
+        if pasted is not None and pasted["text_hash"] == text_hash:
+            df = pasted["df"]
+            show_ingest_report(pasted["report"])
+
+    elif data_source == "💾 Otwórz zapisany projekt":
+        saved_projects = list_projects(user_projects_dir(st.session_state["openai_api_key"]))
+        if not saved_projects:
+            st.info("Nie masz jeszcze zapisanych projektów. Zapisz projekt na dole strony po wygenerowaniu kampanii.")
+        else:
+            project_meta = st.selectbox(
+                "Wybierz projekt",
+                saved_projects,
+                format_func=lambda meta: f"{meta['name']} – {meta['saved_at'].replace('T', ' ')} ({meta['rows']} wierszy, {meta['num_groups']} grup)"
+            )
+            project = load_project(user_projects_dir(st.session_state["openai_api_key"]), project_meta["project_id"], project_meta["saved_at"])
+            if st.button("Otwórz projekt"):
+                open_project(project)
+            if st.session_state.get("open_project") == project.project_id:
+                df = project.data
+                st.sidebar.caption(f"💾 Projekt „{project.meta['name']}” zapisany {project.saved_at.replace('T', ' ')}")
+
     st.sidebar.subheader("2. Dodaj grupy docelowe")
-    num_groups = st.sidebar.number_input(" Ile grup docelowych chcesz dodać?", min_value=2, max_value=20, step=1)
+    auto_groups = st.sidebar.checkbox(
+        "🤖 Dobierz liczbę grup automatycznie",
+        key="auto_groups",
+        help=f"Modele dla 2–{K_SWEEP_MAX} grup są trenowane równolegle i porównywane (silhouette, Calinski-Harabasz, inercja)."
+    )
+    num_groups_slot = st.sidebar.container()
+    num_groups = None if auto_groups else num_groups_slot.number_input(" Ile grup docelowych chcesz dodać?", min_value=2, max_value=20, step=1, key="num_groups")
 
     st.sidebar.subheader("3. Cel kampanii reklamowej")
     campain_goal = st.sidebar.text_area(
         "Wprowadź główny cel kampanii:",
+        key="campaign_goal",
         height=120,
         placeholder="Np. zwiększenie świadomości marki, pozyskanie nowych klientów, zwiększenie sprzedaży produktu..."
     )
 
+    with st.sidebar.expander("⚙️ Ustawienia zaawansowane"):
+        batch_descriptions = st.checkbox(
+            "Generuj opisy grup wsadowo",
+            value=True,
+            help="Opisy wielu grup powstają w jednym zapytaniu (JSON). Przy błędzie aplikacja wraca do zapytań dla pojedynczych grup."
+        )
+        stream_campaigns = st.checkbox(
+            "Wyświetlaj kampanie na bieżąco",
+            value=True,
+            help="Tekst kampanii pojawia się w trakcie generowania (streaming)."
+        )
+
+        profile_token_budget = st.number_input(
+            "Budżet tokenów na profil grupy",
+            min_value=100,
+            max_value=8000,
+            value=PROFILE_TOKEN_BUDGET,
+            step=50,
+            help="Przy szerokich danych do promptu trafiają tylko cechy najmocniej odróżniające grupę od ogółu."
+        )
+        large_data_mode = st.checkbox(
+            "Trenuj model na próbce dla dużych zbiorów",
+            value=True,
+            help="Gdy danych jest więcej niż rozmiar próbki, MiniBatchKMeans uczy się na próbce, a wszystkie wiersze są przypisywane do najbliższego centroidu."
+        )
+        sample_size = st.number_input("Rozmiar próbki treningowej", min_value=1000, max_value=1000000, value=SAMPLE_SIZE, step=1000, disabled=not large_data_mode)
+        incremental_mode = st.checkbox(
+            "Aktualizuj grupy przy dopisanych wierszach",
+            value=True,
+            help="Gdy nowe dane to poprzednie dane z dopisanymi wierszami, nowe wiersze trafiają do istniejących grup bez ponownego trenowania. "
+                 "Opisy i kampanie powstają od nowa tylko dla grup, których centroid wyraźnie się przesunął."
+        )
+        update_centroids = st.checkbox("Przesuwaj centroidy o nowe wiersze", value=True, disabled=not incremental_mode)
+        engines = ["sklearn", "pycaret"] if pycaret_available() else ["sklearn"]
+        clustering_engine = st.selectbox(
+            "Silnik klastrowania",
+            engines,
+            index=engines.index(CLUSTERING_ENGINE) if CLUSTERING_ENGINE in engines else 0,
+            format_func={"sklearn": "scikit-learn (szybki)", "pycaret": "PyCaret"}.get,
+            help="PyCaret jest wczytywany dopiero po wybraniu (kilka sekund przy pierwszym użyciu)."
+        )
+
     bar = st.sidebar
-    if df is not None and num_groups and campain_goal:
+    if df is not None and (num_groups or auto_groups) and campain_goal:
         if "start_generation" not in st.session_state:
             st.session_state.start_generation = False
 
         if bar.button("Generuj kampanie i opisy", type="primary"):
             st.session_state.start_generation = True
 
-        setup(
-            data=df,
-            normalize=True,
-            verbose=False,
-            session_id=42
-        )
+        # Model trenowany jest tylko przy zmianie danych lub parametrów, nie przy każdym rerunie
+        data_fingerprint = dataframe_fingerprint(df)
+        train_sample_size = sample_size if large_data_mode and len(df) > sample_size else None
+
+        # Poprzednia segmentacja z tej sesji - punkt wyjścia dla aktualizacji przyrostowej
+        base = st.session_state.get("segmentation_base")
+        matching_base = not auto_groups and base is not None and base["num_groups"] == num_groups
+        same_data = base is not None and base["fingerprint"] == data_fingerprint
+        new_rows = appended_rows(df, base["row_hashes"], base["columns"]) if incremental_mode and matching_base and not same_data else None
+        drift, project_id = None, None
+
+        if matching_base and same_data and (base["project_id"] is not None or (incremental_mode and base["drift"] is not None)):
+            # Otwarty projekt albo wynik aktualizacji przyrostowej (nie ma ich w cache pełnego trenowania)
+            experiment, model, clustered_df = base["experiment"], base["model"], base["clustered_df"]
+            drift, project_id = base["drift"], base["project_id"]
+        elif new_rows is not None:
+            with st.spinner("Przypisuję nowe wiersze do istniejących grup..."), get_metrics().measure("clustering.incremental"):
+                model, clustered_df, drift = update_clustering(
+                    base["experiment"], base["model"], base["clustered_df"], new_rows, partial_fit=update_centroids
+                )
+            experiment = base["experiment"]
+            # Teksty grup, które wyraźnie się zmieniły, zostaną wygenerowane ponownie
+            for group in drift["moved"]:
+                for key in (f"name_{group}", f"description_{group}", f"campaign_{group}", f"edit_name_{group}", f"edit_desc_{group}"):
+                    st.session_state.pop(key, None)
+        elif auto_groups:
+            experiment, candidates = cached_k_sweep(
+                df,
+                data_fingerprint,
+                tuple(range(2, K_SWEEP_MAX + 1)),
+                normalize=True,
+                session_id=42,
+                sample_size=train_sample_size,
+                engine=clustering_engine
+            )
+            k_options = sorted(candidates)
+            best_k, knee_k = recommend_k(candidates), elbow_k(candidates)
+            num_groups = num_groups_slot.selectbox(
+                "Liczba grup docelowych",
+                k_options,
+                index=k_options.index(best_k),
+                format_func=lambda k: f"{k} ⭐ (zalecana)" if k == best_k else str(k)
+            )
+            model = candidates[num_groups]["model"]
+            clustered_df = cached_candidate_clustering(
+                experiment, model, df, data_fingerprint, num_groups, normalize=True, session_id=42, sample_size=train_sample_size,
+                engine=clustering_engine
+            )
 
-        model = create_model('kmeans', num_clusters=num_groups)
-        clustered_df = assign_model(model)
-        clustered_df = clustered_df.rename(columns={'Cluster': 'Grupa docelowa'})
-        clustered_df["Grupa docelowa"] = clustered_df["Grupa docelowa"].str.replace('Cluster', 'Grupa ')
+            with st.expander("🤖 Dobór liczby grup", expanded=False):
+                st.caption(f"Najwyższy silhouette: k = {best_k}. „Łokieć” krzywej inercji: k = {knee_k}.")
+                sweep_table = pd.DataFrame([
+                    {
+                        "Liczba grup": k,
+                        "Silhouette": candidates[k]["silhouette"],
+                        "Calinski-Harabasz": candidates[k]["calinski_harabasz"],
+                        "Inercja": candidates[k]["inertia"]
+                    }
+                    for k in k_options
+                ]).set_index("Liczba grup")
+                st.dataframe(sweep_table, use_container_width=True)
+                st.line_chart(sweep_table[["Silhouette"]])
+                st.line_chart(sweep_table[["Inercja"]])
+        else:
+            experiment, model, clustered_df = cached_clustering(
+                df,
+                data_fingerprint,
+                num_groups,
+                normalize=True,
+                session_id=42,
+                sample_size=train_sample_size,
+                engine=clustering_engine
+            )
+
+        st.session_state.segmentation_base = {
+            "fingerprint": data_fingerprint,
+            "num_groups": num_groups,
+            "columns": list(df.columns),
+            "row_hashes": base["row_hashes"] if same_data else row_hashes(df),
+            "experiment": experiment,
+            "model": model,
+            "clustered_df": clustered_df,
+            "drift": drift,
+            "project_id": project_id
+        }
+
+        show_session_memory({
+            "Dane": df,
+            "Dane z grupami": clustered_df,
+            "Macierz cech modelu": experiment,
+            "Skróty wierszy": st.session_state.segmentation_base["row_hashes"]
+        })
+
+        if drift is not None:
+            with st.expander("🔄 Aktualizacja przyrostowa", expanded=False):
+                moved = ", ".join(drift["moved"]) or "brak"
+                st.caption(
+                    f"Dopisano {drift['new_rows']} wierszy do istniejących grup. "
+                    f"Grupy z przesunięciem centroidu powyżej {drift['threshold']:g}: {moved}."
+                )
+                st.dataframe(pd.DataFrame({
+                    "Nowe wiersze": drift["new_counts"],
+                    "Przesunięcie centroidu": drift["shifts"]
+                }), use_container_width=True)
+        elif large_data_mode and len(df) > sample_size:
+            st.sidebar.caption(f"🎯 Model wytrenowano na próbce {sample_size:,} z {len(df):,} wierszy.".replace(",", " "))
 
         st.subheader("📊 Analiza i wizualizacja klastrów")
 
         col1, col2 = st.columns(2, gap="small")
+        model_key = model_fingerprint(model)
 
         with col1:
             with st.expander("📄 Twoje dane (oryginalne)", expanded=False):
-                st.dataframe(df)
+                show_data_preview(df, "preview_data", data_fingerprint)
 
         with col2:
             with st.expander("📁 Dane z przypisanymi grupami", expanded=False):
-                st.dataframe(clustered_df)
+                # Nazwy grup nadawane są dopiero przy wyświetlaniu - przypisania trzymają tylko kody grup
+                group_names = {group: st.session_state.get(f"name_{group}") for group in clustered_df[GROUP_COLUMN].unique()}
+                show_data_preview(clustered_df, "preview_groups", f"{data_fingerprint}:{model_key}", group_names)
 
         col3, col4 = st.columns(2, gap="small")
 
         with col3:
             with st.expander("📈 Wizualizacja grup docelowych", expanded=False):
-                plot_model(model, plot='cluster', display_format='streamlit')
+                if isinstance(experiment, FittedPipeline):
+                    st.info("Wykres klastrów nie jest zapisywany w projekcie – pojawi się po ponownym wytrenowaniu modelu.")
+                else:
+                    st.plotly_chart(cached_cluster_figure(experiment, model, model_key), use_container_width=True)
 
         with col4:
             with st.expander("📊 Rozkład liczebności grup docelowych", expanded=False):
-                plt.figure(figsize=(8, 5))
-                clustered_df['Grupa docelowa'].value_counts().plot(kind='bar', color='skyblue', edgecolor='black')
-                plt.title('Liczba użytkowników w grupach')
-                plt.xlabel('Grupa docelowa')
-                plt.ylabel('Liczba użytkowników')
-                plt.tight_layout()
-                st.pyplot(plt)
-
-        def generate_group_descriptions(group_df, nr_group):
-            description_stat = group_df.describe(include='all').to_string()
-            prompt = f"""
-            Jesteś specjalistą ds. marketingu. Oto dane statystyczne użytkowników z grupy {nr_group}:
-            {description_stat}
-
-            Na podstawie tych danych:
-            1. Wymyśl nazwę tej grupy (krótka, chwytliwa, marketingowa).
-            2. Napisz krótki opis (2-3 zdania), czym się ta grupa charakteryzuje.
-
-            Zwróć odpowiedź w formacie:
-            NAZWA: ...
-            OPIS: ...
-            """
-            response = openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                temperature=0,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            return response.choices[0].message.content.strip()
-        
+                group_sizes = clustered_df[GROUP_COLUMN].value_counts()
+                st.image(cached_group_sizes_png(tuple(group_sizes.items())))
+
         summary_data = []
 
         for group in sorted(clustered_df["Grupa docelowa"].unique()):
@@ -366,310 +790,260 @@ if selected == "Generator":
                 "Opis grupy": description
             })
 
-        openai_client = OpenAI(api_key=st.session_state["openai_api_key"])
-        
-        def generate_campaign(group, name, description):
-            prompt = f"""
-            Jesteś specjalistą ds. marketingu. Twoim zadaniem jest przygotować kampanię reklamową dopasowaną do grupy docelowej.
-
-            Cel kampanii: {campain_goal}
-
-            Grupa docelowa: {group}
-            Nazwa grupy: {name}
-            Opis grupy: {description}
-
-            Przygotuj:
-            1. Slogan reklamowy (krótki, chwytliwy, max 10 słów)
-            2. Treść posta na media społecznościowe (2-3 zdania)
-            3. Propozycję kreacji graficznej (opisz jak mogłaby wyglądać reklama: kolorystyka, motyw, bohater itp.)
-            4. Propozycję medium reklamy (np. Instagram, TikTok, baner, mailing itp.) i uzasadnienie
-
-            Zwróć odpowiedź w przejrzystym formacie z punktami.
-            """
-            response = openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                temperature=0,
-                messages=[{"role": "user", "content": prompt}]
+        openai_client = get_openai_pool().get(st.session_state["openai_api_key"])
+
+        all_groups = sorted(clustered_df["Grupa docelowa"].unique())
+
+        def render_group_editor(group):
+            name_key = f"name_{group}"
+            desc_key = f"description_{group}"
+
+            with st.expander(f"👥 {group} – Edytuj nazwę i opis", expanded=False):
+                st.session_state[name_key] = st.text_input("Nazwa grupy:", value=st.session_state[name_key], key=f"edit_name_{group}")
+                st.session_state[desc_key] = st.text_area("Opis grupy:", value=st.session_state[desc_key], key=f"edit_desc_{group}", height=120)
+
+        def campaign_task(group, stream=False):
+            return partial(
+                stream_campaign if stream else generate_campaign,
+                openai_client,
+                campain_goal,
+                group,
+                st.session_state[f"name_{group}"],
+                st.session_state[f"description_{group}"]
             )
-            return response.choices[0].message.content.strip()
-        
+
         if st.session_state.start_generation:
             st.markdown("### ✏️ Zweryfikuj nazwy i opisy grup docelowych")
 
-            all_groups = sorted(clustered_df["Grupa docelowa"].unique())
-                                
-            for group in all_groups:
-                group_df = clustered_df[clustered_df["Grupa docelowa"] == group].drop(columns=["Grupa docelowa"])
+            # Opisy generowane są równolegle, a każda gotowa grupa od razu trafia do swojego miejsca na stronie
+            description_progress = st.empty()
+            editor_slots = {group: st.empty() for group in all_groups}
+            missing_groups = []
 
+            for group in all_groups:
                 name_key = f"name_{group}"
                 desc_key = f"description_{group}"
 
                 if name_key not in st.session_state or desc_key not in st.session_state:
-                    with st.spinner (f"Generuję opis dla {group}..."):
-                        text = generate_group_descriptions(group_df, group)
-
-                    if "NAZWA:" in text and "OPIS:" in text:
-                        try:
-                            name_part, description_part = text.split("OPIS:", 1)
-                            name = name_part.split("NAZWA:", 1)[1].strip()
-                            description = description_part.strip()
-                        except Exception:
-                            name, description = f"Grupa {group}", "Opis niedostępny."
-                    else:
-                        name = f"Grupa {group}"
-                        description = text.strip() or "Brak opisu."
-
-                    st.session_state[name_key] = name
-                    st.session_state[desc_key] = description
+                    missing_groups.append(group)
+                else:
+                    with editor_slots[group].container():
+                        render_group_editor(group)
+
+            # Profile wszystkich brakujących grup liczone są jednym przebiegiem groupby i skracane do budżetu tokenów
+            missing_stats = {}
+            if missing_groups:
+                with get_metrics().measure("profiling"):
+                    missing_stats, profile_report = profile_groups(clustered_df, groups=missing_groups, token_budget=profile_token_budget)
+                if profile_report["tokens_saved"] > 0:
+                    st.caption(
+                        f"✂️ Profile grup ograniczono do średnio {profile_report['features_kept']:.0f} z {profile_report['features']} "
+                        f"najbardziej wyróżniających cech: ~{profile_report['tokens_compact']} tokenów zamiast "
+                        f"~{profile_report['tokens_full']} (oszczędność ~{profile_report['tokens_saved']})."
+                    )
+
+            if missing_stats:
+                description_progress.progress(0.0, text="Generuję opisy grup...")
+                tasks = description_tasks(openai_client, missing_stats, batch=batch_descriptions)
+                done = 0
+                for groups, results in run_concurrently(tasks):
+                    done += len(groups)
+                    description_progress.progress(done / len(missing_stats), text=f"Wygenerowano opisy: {done}/{len(missing_stats)}")
+
+                    if isinstance(results, Exception):
+                        for group in groups:
+                            editor_slots[group].warning(f"⚠️ Nie udało się wygenerować opisu dla {group}: {results}")
+                        continue
+
+                    for group, (name, description) in results.items():
+                        st.session_state[f"name_{group}"] = name
+                        st.session_state[f"description_{group}"] = description
+
+                        with editor_slots[group].container():
+                            render_group_editor(group)
+                description_progress.empty()
 
             if "regenerate_campaigns" not in st.session_state:
                 st.session_state["regenerate_campaigns"] = False
-            
-            for group in all_groups:
-                name_key = f"name_{group}"
-                desc_key = f"description_{group}"
-                campaign_key = f"campaign_{group}"
-
-                with st.expander(f"👥 {group} – Edytuj nazwę i opis", expanded=False):
-                    st.session_state[name_key] = st.text_input("Nazwa grupy:", value=st.session_state[name_key], key=f"edit_name_{group}")
-                    st.session_state[desc_key] = st.text_area("Opis grupy:", value=st.session_state[desc_key], key=f"edit_desc_{group}", height=120)
 
             if st.button("💾 Zapisz zmiany", type="secondary"):
                 st.session_state.regenerate_campaigns = True
+                # Kampanie zostaną wygenerowane ponownie (strumieniowo lub równolegle) w sekcji poniżej
                 for group in all_groups:
-                    name = st.session_state.get(f"name_{group}", "")
-                    description = st.session_state.get(f"description_{group}", "")
-                    campaign_key = f"campaign_{group}"
-
-                    with st.spinner(f"Generuję kampanię reklamową dla {group}..."):
-                        st.session_state[campaign_key] = generate_campaign(group, name, description)
+                    st.session_state.pop(f"campaign_{group}", None)
 
                 st.success(" Zaktualizowano kampanie na podstawie nowych nazw i opisów")    
 
         st.subheader("📢 Kampanie reklamowe")
 
-        for group in sorted(clustered_df["Grupa docelowa"].unique()):
+        def render_campaign(group):
             name = st.session_state.get(f"name_{group}", "")
-            description = st.session_state.get(f"description_{group}", "")
             campaign_key = f"campaign_{group}"
-
-            if campaign_key not in st.session_state:
-                with st.spinner(f"Generuję kampanię reklamową dla {group}..."):
-                    st.session_state[campaign_key] = generate_campaign(group, name, description)
-
             campaign = st.session_state[campaign_key]
             with st.expander(f"💡 Kampania reklamowa dla {name} ({group})", expanded=True):
                 st.markdown(campaign)
 
-                def export_campaign_to_pdf(title: str, content: str) -> BytesIO:
-                    import re
-                    
-                    buffer = BytesIO()
-                    c = canvas.Canvas(buffer, pagesize=A4)
-                    width, height = A4
-                    margin_left = 2 * cm
-                    margin_top = height - 2 * cm
-                    line_height = 16
-                    
-                    # Rejestracja fontów z obsługą polskich znaków
-                    font_name = 'Helvetica'
-                    font_bold = 'Helvetica-Bold'
-                    
-                    try:
-                        system = platform.system()
-                        font_registered = False
-                        
-                        font_paths = []
-                        if system == "Windows":
-                            font_paths = [
-                                ("C:/Windows/Fonts/arial.ttf", "C:/Windows/Fonts/arialbd.ttf"),
-                                ("C:/Windows/Fonts/calibri.ttf", "C:/Windows/Fonts/calibrib.ttf"),
-                                ("C:/Windows/Fonts/tahoma.ttf", "C:/Windows/Fonts/tahomabd.ttf")
-                            ]
-                        elif system == "Darwin":  # macOS
-                            font_paths = [
-                                ("/System/Library/Fonts/Arial.ttf", "/System/Library/Fonts/Arial Bold.ttf"),
-                            ]
-                        else:  # Linux
-                            font_paths = [
-                                ("/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf", 
-                                "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf"),
-                                ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 
-                                "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf")
-                            ]
-                        
-                        for regular_path, bold_path in font_paths:
-                            if os.path.exists(regular_path):
-                                try:
-                                    pdfmetrics.registerFont(TTFont('CustomFont', regular_path))
-                                    font_name = 'CustomFont'
-                                    if os.path.exists(bold_path):
-                                        pdfmetrics.registerFont(TTFont('CustomFont-Bold', bold_path))
-                                        font_bold = 'CustomFont-Bold'
-                                    else:
-                                        font_bold = 'CustomFont'
-                                    font_registered = True
-                                    break
-                                except:
-                                    continue
-                    except:
-                        pass
-                    
-                    def clean_text(text):
-                        """Zamień polskie znaki na bezpieczne w razie problemów"""
-                        replacements = {
-                            'ą': 'a', 'ć': 'c', 'ę': 'e', 'ł': 'l', 'ń': 'n', 'ó': 'o', 'ś': 's', 'ź': 'z', 'ż': 'z',
-                            'Ą': 'A', 'Ć': 'C', 'Ę': 'E', 'Ł': 'L', 'Ń': 'N', 'Ó': 'O', 'Ś': 'S', 'Ź': 'Z', 'Ż': 'Z'
-                        }
-                        for old, new in replacements.items():
-                            text = text.replace(old, new)
-                        return text
-                    
-                    def parse_markdown_line(line):
-                        """Parsuje pojedynczą linię Markdown i zwraca informacje o formatowaniu"""
-                        original_line = line
-                        
-                        # Nagłówki
-                        if line.startswith('####'):
-                            return {'text': line[4:].strip(), 'type': 'header4', 'font': font_bold, 'size': 12}
-                        elif line.startswith('###'):
-                            return {'text': line[3:].strip(), 'type': 'header3', 'font': font_bold, 'size': 14}
-                        elif line.startswith('##'):
-                            return {'text': line[2:].strip(), 'type': 'header2', 'font': font_bold, 'size': 16}
-                        elif line.startswith('#'):
-                            return {'text': line[1:].strip(), 'type': 'header1', 'font': font_bold, 'size': 18}
-                        
-                        # Listy numerowane
-                        elif re.match(r'^\d+\.', line.strip()):
-                            text = re.sub(r'^\d+\.\s*', '', line.strip())
-                            return {'text': f"• {text}", 'type': 'list', 'font': font_name, 'size': 11}
-                        
-                        # Listy punktowane
-                        elif line.strip().startswith('-') or line.strip().startswith('*'):
-                            text = line.strip()[1:].strip()
-                            return {'text': f"• {text}", 'type': 'list', 'font': font_name, 'size': 11}
-                        
-                        # Tekst pogrubiony **text**
-                        elif '**' in line:
-                            # Usuń gwiazdki i oznacz jako pogrubiony
-                            text = re.sub(r'\*\*(.*?)\*\*', r'\1', line)
-                            return {'text': text, 'type': 'bold', 'font': font_bold, 'size': 11}
-                        
-                        # Zwykły tekst
-                        else:
-                            return {'text': line, 'type': 'normal', 'font': font_name, 'size': 11}
-                    
-                    def draw_text_safely(canvas, x, y, text, font, size):
-                        """Rysuje tekst z obsługą błędów kodowania"""
-                        try:
-                            canvas.setFont(font, size)
-                            canvas.drawString(x, y, text)
-                            return True
-                        except:
-                            try:
-                                canvas.setFont('Helvetica-Bold' if 'Bold' in font else 'Helvetica', size)
-                                canvas.drawString(x, y, clean_text(text))
-                                return True
-                            except:
-                                return False
-                    
-                    def wrap_text(text, font, size, max_width):
-                        """Łamie tekst na linie dopasowane do szerokości"""
-                        words = text.split()
-                        lines = []
-                        current_line = ""
-                        
-                        for word in words:
-                            test_line = f"{current_line} {word}".strip()
-                            try:
-                                test_width = stringWidth(test_line, font, size)
-                            except:
-                                test_width = len(test_line) * (size * 0.6)  # Przybliżone
-                            
-                            if test_width <= max_width:
-                                current_line = test_line
-                            else:
-                                if current_line:
-                                    lines.append(current_line)
-                                current_line = word
-                        
-                        if current_line:
-                            lines.append(current_line)
-                        
-                        return lines
-                    
-                    # Tytuł dokumentu
-                    try:
-                        c.setFont(font_bold, 20)
-                        c.drawString(margin_left, margin_top, title)
-                    except:
-                        c.setFont('Helvetica-Bold', 20)
-                        c.drawString(margin_left, margin_top, clean_text(title))
-                    
-                    y = margin_top - 40
-                    max_width = width - 2 * margin_left
-                    
-                    # Przetwarzanie treści
-                    lines = content.split('\n')
-                    
-                    for line in lines:
-                        line = line.strip()
-                        
-                        if not line:  # Pusta linia
-                            y -= line_height * 0.5
-                            continue
-                        
-                        # Parsuj linię
-                        parsed = parse_markdown_line(line)
-                        
-                        # Sprawdź czy trzeba przejść na nową stronę
-                        if y < 3 * cm:
-                            c.showPage()
-                            y = height - 2 * cm
-                        
-                        # Dodatkowy odstęp przed nagłówkami
-                        if parsed['type'].startswith('header'):
-                            y -= 5
-                        
-                        # Zawijanie tekstu dla długich linii
-                        wrapped_lines = wrap_text(parsed['text'], parsed['font'], parsed['size'], max_width)
-                        
-                        for wrapped_line in wrapped_lines:
-                            if y < 2 * cm:
-                                c.showPage()
-                                y = height - 2 * cm
-                            
-                            # Wcięcie dla list
-                            x_pos = margin_left + (15 if parsed['type'] == 'list' else 0)
-                            
-                            draw_text_safely(c, x_pos, y, wrapped_line, parsed['font'], parsed['size'])
-                            y -= line_height
-                        
-                        # Dodatkowy odstęp po nagłówkach
-                        if parsed['type'].startswith('header'):
-                            y -= 5
-                    
-                    c.save()
-                    buffer.seek(0)
-                    return buffer
-                
-                pdf = export_campaign_to_pdf(f"Kampania reklamowa - {name}", campaign)
-                st.download_button(
-                    label="📥 Pobierz kampanię jako PDF",
-                    data=pdf,
-                    file_name=f"kampania_{name}.pdf",
-                    mime="application/pdf",
-                    key=f"download_pdf_{group}"
+                title = f"Kampania reklamowa - {name}"
+                pdf_hash = hashlib.sha256(f"{title}\x00{campaign}".encode("utf-8")).hexdigest()
+                pdf_state_key = f"pdf_requested_{group}"
+
+                # PDF renderowany jest dopiero na żądanie i tylko dla zmienionej treści kampanii
+                if st.session_state.get(pdf_state_key) != pdf_hash:
+                    if st.button("📄 Przygotuj PDF", key=f"prepare_pdf_{group}"):
+                        st.session_state[pdf_state_key] = pdf_hash
+
+                if st.session_state.get(pdf_state_key) == pdf_hash:
+                    st.download_button(
+                        label="📥 Pobierz kampanię jako PDF",
+                        data=campaign_pdf_bytes(title, campaign),
+                        file_name=f"kampania_{name}.pdf",
+                        mime="application/pdf",
+                        key=f"download_pdf_{group}",
+                        on_click="ignore"
+                    )
+
+        campaign_slots = {group: st.empty() for group in all_groups}
+        campaign_tasks = {}
+
+        for group in all_groups:
+            if f"campaign_{group}" in st.session_state:
+                with campaign_slots[group].container():
+                    render_campaign(group)
+            elif not (st.session_state.get(f"name_{group}") and st.session_state.get(f"description_{group}")):
+                # Bez nazwy i opisu kampania byłaby ogólnikowa, a zapamiętana nie powstałaby ponownie po uzupełnieniu opisu
+                campaign_slots[group].info(f"Kampania dla {group} powstanie po wygenerowaniu lub uzupełnieniu nazwy i opisu grupy.")
+            else:
+                campaign_tasks[group] = campaign_task(group, stream=stream_campaigns)
+
+        if campaign_tasks and stream_campaigns:
+            # Tekst pojawia się na bieżąco; zmiana danych w trakcie przerywa rerun i zamyka otwarte strumienie,
+            # a niepełne kampanie nie trafiają do session_state
+            previews = {}
+            for group in campaign_tasks:
+                name = st.session_state.get(f"name_{group}", "")
+                with campaign_slots[group].container():
+                    with st.expander(f"💡 Kampania reklamowa dla {name} ({group})", expanded=True):
+                        previews[group] = st.empty()
+                        previews[group].caption("Generuję kampanię reklamową...")
+
+            partial_texts = {group: "" for group in campaign_tasks}
+            for group, delta, campaign in stream_concurrently(campaign_tasks):
+                if delta is not None:
+                    partial_texts[group] += delta
+                    previews[group].markdown(partial_texts[group] + " ▌")
+                    continue
+
+                if isinstance(campaign, Exception):
+                    campaign_slots[group].warning(f"⚠️ Nie udało się wygenerować kampanii dla {group}: {campaign}")
+                    continue
+
+                st.session_state[f"campaign_{group}"] = campaign
+                with campaign_slots[group].container():
+                    render_campaign(group)
+
+        elif campaign_tasks:
+            with st.spinner("Generuję kampanie reklamowe..."):
+                for group, campaign in run_concurrently(campaign_tasks):
+                    if isinstance(campaign, Exception):
+                        campaign_slots[group].warning(f"⚠️ Nie udało się wygenerować kampanii dla {group}: {campaign}")
+                        continue
+
+                    st.session_state[f"campaign_{group}"] = campaign
+                    with campaign_slots[group].container():
+                        render_campaign(group)
+
+        ready_campaigns = tuple(
+            (
+                f"Kampania reklamowa - {st.session_state.get(f'name_{group}', '')}",
+                st.session_state[f"campaign_{group}"],
+                f"kampania_{st.session_state.get(f'name_{group}', '')}.pdf"
+            )
+            for group in all_groups
+            if f"campaign_{group}" in st.session_state
+        )
+
+        if ready_campaigns and len(ready_campaigns) == len(all_groups):
+            st.subheader("📦 Eksport wszystkich kampanii")
+
+            # Eksport zbiorczy również powstaje dopiero na żądanie
+            bulk_hash = hashlib.sha256(json.dumps([ready_campaigns, data_fingerprint]).encode("utf-8")).hexdigest()
+            if st.session_state.get("bulk_export_requested") != bulk_hash:
+                if st.button("📦 Przygotuj eksport zbiorczy", key="prepare_bulk_export"):
+                    st.session_state["bulk_export_requested"] = bulk_hash
+
+            if st.session_state.get("bulk_export_requested") == bulk_hash:
+                col1, col2 = st.columns(2, gap="small")
+
+                with col1:
+                    st.download_button(
+                        label="📥 Pobierz wszystkie kampanie (PDF ze spisem treści)",
+                        data=campaigns_pdf_bytes(ready_campaigns),
+                        file_name="kampanie.pdf",
+                        mime="application/pdf",
+                        key="download_all_pdf",
+                        on_click="ignore"
+                    )
+
+                with col2:
+                    with open(campaigns_zip_path(ready_campaigns, clustered_df, data_fingerprint), "rb") as zip_file:
+                        st.download_button(
+                            label="🗜️ Pobierz ZIP (PDF każdej grupy + CSV z danymi)",
+                            data=zip_file,
+                            file_name="kampanie.zip",
+                            mime="application/zip",
+                            key="download_all_zip",
+                            on_click="ignore"
+                        )
+
+        st.subheader("💾 Projekt")
+        project_name = st.text_input(
+            "Nazwa projektu",
+            value=st.session_state.get("open_project", ""),
+            placeholder="Np. klienci_2024_q3",
+            help="Zapisuje dane z grupami, model oraz nazwy, opisy i kampanie. Otwarcie projektu nie wymaga trenowania ani zapytań do OpenAI."
+        )
+        projects_dir = user_projects_dir(st.session_state["openai_api_key"])
+        project_id = project_id_from_name(project_name)
+        overwrite = True
+        if project_id and project_id != st.session_state.get("open_project") and project_exists(project_id, projects_dir):
+            st.warning(f"Projekt „{project_id}” już istnieje - zapis zastąpi jego dane, model i teksty.")
+            overwrite = st.checkbox("Nadpisz istniejący projekt", key="overwrite_project")
+        if st.button("💾 Zapisz projekt", disabled=not project_id or not overwrite):
+            texts = {
+                group: {
+                    field: st.session_state[f"{field}_{group}"]
+                    for field in ("name", "description", "campaign")
+                    if f"{field}_{group}" in st.session_state
+                }
+                for group in all_groups
+            }
+            with st.spinner("Zapisuję projekt..."):
+                save_project(
+                    project_id,
+                    experiment,
+                    model,
+                    clustered_df,
+                    st.session_state.segmentation_base["row_hashes"],
+                    texts,
+                    num_groups,
+                    campaign_goal=campain_goal,
+                    name=project_name.strip(),
+                    projects_dir=projects_dir
                 )
+            st.success(f"✅ Zapisano projekt „{project_name.strip()}”.")
+
+    show_llm_cache_stats()
+    show_metrics_panel()
 
 # ---CONTACT PAGE---
 if selected == "Kontakt":
     show_user_role()
+    show_animation_settings()
     
     col1, col2 = st.columns(2, gap="small", vertical_alignment="center", )
 
     with col1:
-        display_lottie_responsive(lottie_a5, key_suffix="contact_1", speed=1, height_ratio=0.4)
+        display_lottie_responsive("a5", key_suffix="contact_1", speed=1, height_ratio=0.4)
 
     with col2:
         st.markdown("""
@@ -746,7 +1120,7 @@ if selected == "Kontakt":
 
 
     with col2:
-        display_lottie_responsive(lottie_a4, key_suffix="contact_2", speed=1, loop=False, height_ratio=0.6)
+        display_lottie_responsive("a4", key_suffix="contact_2", speed=1, loop=False, height_ratio=0.6)
 
     st.markdown("""---""")
 
@@ -755,14 +1129,13 @@ if selected == "Kontakt":
         Poniżej znajduje się lista bibliotek i modułów użytych w aplikacji **Zaplanuj.to**, wraz z krótkim opisem ich roli:
         - **streamlit** – framework do budowy interfejsu webowego, umożliwiający szybkie tworzenie aplikacji w Pythonie.
         - **pandas** – do wczytywania, przetwarzania i analizy danych z plików CSV lub tekstu wprowadzanego ręcznie.
-        - **pycaret[clustering]** – narzędzie do automatycznego trenowania modeli klastrowania (np. K-means), przypisywania grup i generowania wizualizacji.
+        - **scikit-learn** – domyślny, lekki silnik klastrowania (standaryzacja, kodowanie one-hot, K-means) oraz rzut PCA do wykresu grup.
+        - **pycaret[clustering]** – opcjonalny silnik do automatycznego trenowania modeli klastrowania, wczytywany dopiero po wybraniu w ustawieniach.
+        - **plotly** – interaktywny wykres grup docelowych.
         - **matplotlib** – biblioteka do tworzenia wykresów i wizualizacji danych, wykorzystywana głównie do wyświetlania wyników klastrowania.
         - **streamlit-option-menu** – pozwala na tworzenie estetycznych i intuicyjnych menu nawigacyjnych z ikonami i układem poziomym.
         - **streamlit-lottie** – do odtwarzania animacji w formacie Lottie, które wzbogacają i uatrakcyjniają interfejs użytkownika.
         - **json** – do ładowania i przetwarzania plików animacji `.json` w formacie Lottie.
-        - **requests** – biblioteka do wykonywania zapytań HTTP, potencjalnie używana do pobierania zasobów z internetu (aktualnie zaimportowana, ale nieużywana).
-        - **time** – do kontrolowania opóźnień i symulacji ładowania, np. podczas wczytywania danych lub generowania wyników.
-        - **io.StringIO** – umożliwia konwersję wprowadzonego tekstu CSV na format czytelny dla pandas jako plik w pamięci.
         - **openai** – interfejs do komunikacji z API OpenAI, wykorzystywany do generowania nazw grup, opisów i kampanii reklamowych.
         - **reportlab** – do tworzenia i eksportu wygenerowanych kampanii reklamowych w formacie PDF.
         """)
\ No newline at end of file
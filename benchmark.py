@@ -0,0 +1,379 @@
+# BENCHMARK - powtarzalny pomiar wydajności całej ścieżki Generatora bez sieci
+#
+# Użycie:
+#   python benchmark.py                                          # 1k i 100k wierszy × 5 i 50 kolumn
+#   ZAPLANUJ_MAX_UPLOAD_MB=2000 python benchmark.py --rows 1000 100000 1000000 --columns 5 50 200 --latency 0.5
+#   python benchmark.py --save-baseline benchmarks/baseline.json
+#   python benchmark.py --baseline benchmarks/baseline.json     # kod wyjścia 1 przy regresji
+#
+# Dane klientów są syntetyczne (stałe ziarno), a zapytania do LLM obsługuje lokalny fake_openai.py,
+# więc kolejne uruchomienia na tej samej maszynie mierzą to samo.
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from functools import partial
+
+# Cache odpowiedzi zafałszowałby pomiar zapytań do LLM - każde powtórzenie ma je wysyłać
+os.environ.setdefault("ZAPLANUJ_LLM_CACHE", "off")
+
+import numpy as np
+import pandas as pd
+from openai import OpenAI
+
+from clustering import CLUSTERING_ENGINE, SAMPLE_SIZE, fit_clustering
+from fake_openai import FakeOpenAIServer
+from ingestion import DataBudgetError, read_csv_budgeted
+from llm import (
+    build_campaign_prompt,
+    build_description_prompt,
+    description_tasks,
+    generate_campaign,
+    run_concurrently
+)
+from pdf_export import export_campaigns_to_pdf
+from profiling import profile_groups
+
+BENCHMARK_DATA_DIR = os.path.join(".cache", "benchmark")
+DEFAULT_ROWS = [1000, 100000]
+DEFAULT_COLUMNS = [5, 50]
+# Regresja: mediana czasu (lub szczyt RSS) gorsza od bazowej o więcej niż tolerancja i niż próg szumu
+REGRESSION_TOLERANCE = 0.25
+NOISE_FLOOR_S = 0.01
+NOISE_FLOOR_MB = 16
+
+WARMUP_ROWS = 200
+# Moduły, których czas importu (start aplikacji) jest mierzony w osobnym procesie
+STARTUP_MODULES = ["app", "clustering"]
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| (\S+)\s*$")
+SEGMENTS = 5
+SYNTHETIC_CHUNK_ROWS = 100000
+CITIES = ["Warszawa", "Kraków", "Wrocław", "Gdańsk", "Poznań", "Łódź", "Lublin", "Szczecin"]
+CHANNELS = ["sklep", "www", "aplikacja", "telefon"]
+
+
+# ---SYNTHETIC DATA---
+def column_specs(columns: int, seed: int = 0) -> list:
+    """
+    Kolumny danych syntetycznych: pięć nazwanych cech klienta, a dalej ok. 70% cech liczbowych
+    (średnia zależna od segmentu) i 30% kategorycznych (kategorie przesunięte zależnie od segmentu).
+    """
+    rng = np.random.default_rng(seed)
+    specs = [
+        ("wiek", "age", None),
+        ("dochod_miesieczny", "income", None),
+        ("liczba_zakupow", "purchases", None),
+        ("kanal", "category", (CHANNELS, np.arange(SEGMENTS) % len(CHANNELS))),
+        ("miasto", "category", (CITIES, (np.arange(SEGMENTS) * 2) % len(CITIES)))
+    ][:columns]
+    for i in range(len(specs), columns):
+        if i % 10 < 7:
+            specs.append((f"cecha_{i}", "numeric", rng.normal(0, 3, size=SEGMENTS)))
+        else:
+            categories = [f"k{i}_{c}" for c in range(int(rng.integers(3, 12)))]
+            specs.append((f"kategoria_{i}", "category", (categories, rng.integers(0, len(categories), size=SEGMENTS))))
+    return specs
+
+
+def synthetic_customers(rows: int, columns: int, seed: int = 0, chunk: int = 0) -> pd.DataFrame:
+    """Porcja danych klientów z ukrytym podziałem na SEGMENTS segmentów (ta sama porcja dla tych samych argumentów)"""
+    rng = np.random.default_rng([seed, chunk])
+    segment = rng.integers(0, SEGMENTS, size=rows)
+    data = {}
+    for name, kind, params in column_specs(columns, seed):
+        if kind == "age":
+            data[name] = np.clip(rng.normal(25 + 9 * segment, 6), 18, 90).round().astype(np.int16)
+        elif kind == "income":
+            data[name] = rng.lognormal(8.2 + 0.15 * segment, 0.35).round(2)
+        elif kind == "purchases":
+            data[name] = rng.poisson(2 + 3 * segment).astype(np.int32)
+        elif kind == "numeric":
+            data[name] = (params[segment] + rng.normal(0, 1, size=rows)).round(3)
+        else:
+            # Kody kategorii zamiast tekstów - porcja 1M × 200 kolumn mieści się w pamięci
+            categories, offsets = params
+            codes = (offsets[segment] + rng.integers(0, 2, size=rows)) % len(categories)
+            data[name] = pd.Categorical.from_codes(codes, categories)
+    return pd.DataFrame(data)
+
+
+def synthetic_csv(rows: int, columns: int, seed: int = 0, data_dir: str = BENCHMARK_DATA_DIR, chunk_rows: int = SYNTHETIC_CHUNK_ROWS) -> str:
+    """Ścieżka pliku CSV z danymi syntetycznymi - generowany raz (porcjami) i trzymany w data_dir"""
+    path = os.path.join(data_dir, f"klienci_{rows}x{columns}_s{seed}.csv")
+    if not os.path.exists(path):
+        print(f"📝 Generuję {os.path.basename(path)}...", file=sys.stderr, flush=True)
+        os.makedirs(data_dir, exist_ok=True)
+        tmp_path = f"{path}.part"
+        with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+            for chunk, start in enumerate(range(0, rows, chunk_rows)):
+                df = synthetic_customers(min(chunk_rows, rows - start), columns, seed, chunk)
+                df.to_csv(f, index=False, header=chunk == 0)
+        os.replace(tmp_path, path)
+    return path
+
+
+# ---MEASUREMENT---
+def reset_peak_rss():
+    """Zeruje szczyt RSS procesu (Linux, /proc/self/clear_refs); na innych systemach szczyt liczony jest od startu"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        # Windows - bez /proc i bez modułu resource szczyt pamięci nie jest mierzony
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss: kilobajty na Linuksie, bajty na macOS
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def measure_stage(run, repeat: int, units: float, unit: str):
+    """Wykonuje run() repeat razy. Zwraca (wynik ostatniego przebiegu, statystyki: p50, p95, przepustowość, szczyt RSS)."""
+    times, peaks, result = [], [], None
+    for _ in range(repeat):
+        reset_peak_rss()
+        started = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - started)
+        peaks.append(peak_rss_mb())
+
+    p50 = float(np.percentile(times, 50))
+    return result, {
+        "p50_s": round(p50, 6),
+        "p95_s": round(float(np.percentile(times, 95)), 6),
+        "mean_s": round(float(np.mean(times)), 6),
+        "throughput": round(units / p50, 1) if p50 else None,
+        "unit": unit,
+        "peak_rss_mb": round(max(peaks), 1) if None not in peaks else None
+    }
+
+
+def import_time(module: str) -> dict:
+    """
+    Import modułu w nowym interpreterze (python -X importtime): skumulowany czas importu modułu,
+    czas całego procesu i to, czy po drodze zaimportowano PyCaret (powinien ładować się dopiero na żądanie).
+    """
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - started
+    cumulative, pycaret = None, False
+    for line in completed.stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if match:
+            cumulative = int(match.group(1)) / 1e6 if match.group(2) == module else cumulative
+            pycaret = pycaret or match.group(2).startswith("pycaret")
+    return {"import_s": cumulative, "process_s": wall, "pycaret": pycaret}
+
+
+def run_startup(repeat: int = 3, modules: list = STARTUP_MODULES) -> dict:
+    """Czas startu: import aplikacji i modułu klastrowania w świeżym procesie, {moduł: statystyki}"""
+    stages = {}
+    for module in modules:
+        runs = [import_time(module) for _ in range(repeat)]
+        times = [run["import_s"] for run in runs]
+        stages[f"import {module}"] = {
+            "p50_s": round(float(np.percentile(times, 50)), 6),
+            "p95_s": round(float(np.percentile(times, 95)), 6),
+            "mean_s": round(float(np.mean(times)), 6),
+            "process_p50_s": round(float(np.percentile([run["process_s"] for run in runs], 50)), 6),
+            "throughput": None,
+            "unit": "s",
+            "peak_rss_mb": None,
+            "pycaret_imported": any(run["pycaret"] for run in runs)
+        }
+    return stages
+
+
+# ---PIPELINE STAGES---
+def run_case(rows: int, columns: int, openai_client, server: FakeOpenAIServer, num_groups: int = 4, repeat: int = 3, seed: int = 0,
+             engine: str = CLUSTERING_ENGINE, sample_size: int = SAMPLE_SIZE) -> dict:
+    """Wszystkie etapy Generatora dla jednego rozmiaru danych: {etap: statystyki}"""
+    path = synthetic_csv(rows, columns, seed)
+    stages = {}
+
+    def ingest():
+        # Ten sam limit rozmiaru co w aplikacji (ZAPLANUJ_MAX_UPLOAD_MB) - większe przypadki są pomijane
+        with open(path, "rb") as source:
+            return read_csv_budgeted(source, size_bytes=os.path.getsize(path), max_rows=rows)[0]
+
+    df, stages["ingestion"] = measure_stage(ingest, repeat, rows, "wierszy/s")
+
+    clustering = partial(
+        fit_clustering, df, num_groups, session_id=seed, sample_size=sample_size if sample_size and rows > sample_size else None, engine=engine
+    )
+    (_, _, clustered_df), stages["clustering"] = measure_stage(clustering, repeat, rows, "wierszy/s")
+
+    (profiles, _), stages["profiling"] = measure_stage(partial(profile_groups, clustered_df), repeat, rows, "wierszy/s")
+
+    def prompts():
+        return [
+            (build_description_prompt(profile, group), build_campaign_prompt("zwiększenie sprzedaży", group, f"Segment {group}", profile))
+            for group, profile in profiles.items()
+        ]
+
+    _, stages["prompts"] = measure_stage(prompts, repeat, 2 * len(profiles), "promptów/s")
+
+    def generate():
+        descriptions = {}
+        for _, result in run_concurrently(description_tasks(openai_client, profiles, batch=True)):
+            if isinstance(result, Exception):
+                raise result
+            descriptions.update(result)
+        campaign_tasks = {
+            group: partial(generate_campaign, openai_client, "zwiększenie sprzedaży", group, *descriptions[group]) for group in profiles
+        }
+        campaigns = {}
+        for group, result in run_concurrently(campaign_tasks):
+            if isinstance(result, Exception):
+                raise result
+            campaigns[group] = (f"Kampania reklamowa - {descriptions[group][0]}", result)
+        return [campaigns[group] for group in profiles]
+
+    requests_before = server.request_count
+    campaigns, stages["llm"] = measure_stage(generate, repeat, 0, "zapytań/s")
+    requests = (server.request_count - requests_before) / repeat
+    stages["llm"]["requests"] = requests
+    stages["llm"]["throughput"] = round(requests / stages["llm"]["p50_s"], 1) if stages["llm"]["p50_s"] else None
+
+    _, stages["pdf"] = measure_stage(partial(export_campaigns_to_pdf, campaigns), repeat, len(campaigns), "kampanii/s")
+    return stages
+
+
+def compare_to_baseline(report: dict, baseline: dict, tolerance: float = REGRESSION_TOLERANCE) -> list:
+    """Lista regresji względem bazowego raportu (czas p50 i szczyt RSS dla wspólnych przypadków i etapów)"""
+    regressions = []
+    for case, stages in report["cases"].items():
+        for stage, current in stages.items():
+            previous = baseline.get("cases", {}).get(case, {}).get(stage)
+            if not isinstance(previous, dict) or not isinstance(current, dict):
+                continue
+            checks = (("p50_s", NOISE_FLOOR_S), ("peak_rss_mb", NOISE_FLOOR_MB))
+            for metric, noise_floor in checks:
+                before, after = previous.get(metric), current.get(metric)
+                if before is None or after is None:
+                    continue
+                if after > before * (1 + tolerance) and after - before > noise_floor:
+                    regressions.append({"case": case, "stage": stage, "metric": metric, "baseline": before, "current": after})
+    return regressions
+
+
+def run_benchmark(rows_list: list = DEFAULT_ROWS, columns_list: list = DEFAULT_COLUMNS, num_groups: int = 4, repeat: int = 3,
+                  latency: float = 0.2, seed: int = 0, engine: str = CLUSTERING_ENGINE, sample_size: int = SAMPLE_SIZE,
+                  startup: bool = True) -> dict:
+    server = FakeOpenAIServer(latency=latency).start()
+    openai_client = OpenAI(api_key="benchmark", base_url=server.base_url, max_retries=0)
+    cases = {}
+    if startup:
+        print("⏱️ startup...", file=sys.stderr, flush=True)
+        cases["startup"] = run_startup(repeat)
+    try:
+        # Rozgrzewka (importy, czcionki PDF, połączenia HTTP) - inaczej pierwszy przypadek wypadałby gorzej od kolejnych
+        run_case(WARMUP_ROWS, min(columns_list), openai_client, server, num_groups, 1, seed, engine, sample_size)
+        for rows in rows_list:
+            for columns in columns_list:
+                case = f"{rows}x{columns}"
+                print(f"⏱️ {case}...", file=sys.stderr, flush=True)
+                try:
+                    cases[case] = run_case(rows, columns, openai_client, server, num_groups, repeat, seed, engine, sample_size)
+                except DataBudgetError as e:
+                    cases[case] = {"skipped": str(e)}
+    finally:
+        server.stop()
+
+    return {
+        "config": {
+            "rows": rows_list,
+            "columns": columns_list,
+            "groups": num_groups,
+            "repeat": repeat,
+            "latency_s": latency,
+            "seed": seed,
+            "engine": engine,
+            "sample_size": sample_size
+        },
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "cases": cases
+    }
+
+
+def print_report(report: dict):
+    print(f"{'przypadek':<14}{'etap':<20}{'p50 [s]':>10}{'p95 [s]':>10}{'przepustowość':>26}{'RSS [MB]':>10}")
+    for case, stages in report["cases"].items():
+        if "skipped" in stages:
+            print(f"{case:<14}pominięty: {stages['skipped']}")
+            continue
+        for stage, result in stages.items():
+            throughput = f"{result['throughput']} {result['unit']}" if result["throughput"] is not None else "-"
+            peak_rss = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "-"
+            print(f"{case:<14}{stage:<20}{result['p50_s']:>10.4f}{result['p95_s']:>10.4f}{throughput:>26}{peak_rss:>10}")
+            if result.get("pycaret_imported"):
+                print(f"{'':<14}⚠️ {stage}: PyCaret importowany przy starcie")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Zaplanuj.to - benchmark ścieżki Generatora na danych syntetycznych, bez sieci")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="Liczby wierszy (np. 1000 100000 1000000)")
+    parser.add_argument("--columns", type=int, nargs="+", default=DEFAULT_COLUMNS, help="Liczby kolumn (np. 5 50 200)")
+    parser.add_argument("-k", "--groups", type=int, default=4, help="Liczba grup docelowych")
+    parser.add_argument("--repeat", type=int, default=3, help="Liczba powtórzeń każdego etapu")
+    parser.add_argument("--latency", type=float, default=0.2, help="Opóźnienie odpowiedzi lokalnego API w sekundach")
+    parser.add_argument("--seed", type=int, default=0, help="Ziarno danych syntetycznych i modelu")
+    parser.add_argument("--engine", choices=["sklearn", "pycaret"], default=CLUSTERING_ENGINE, help="Silnik klastrowania")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE, help="Próbka treningowa dla dużych danych (0 - bez próbkowania)")
+    parser.add_argument("--no-startup", action="store_true", help="Bez pomiaru czasu importu aplikacji (start w nowym procesie)")
+    parser.add_argument("-o", "--output", help="Plik JSON z wynikami")
+    parser.add_argument("--save-baseline", help="Zapisuje wyniki jako raport bazowy")
+    parser.add_argument("--baseline", help="Raport bazowy do porównania - regresje kończą się kodem wyjścia 1")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="Dopuszczalne pogorszenie względem bazowego (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.rows, args.columns, args.groups, args.repeat, args.latency, args.seed, args.engine, args.sample_size,
+                           startup=not args.no_startup)
+    print_report(report)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(
+                f"❌ Regresja {regression['case']} / {regression['stage']}: {regression['metric']} "
+                f"{regression['baseline']} -> {regression['current']}"
+            )
+        if regressions:
+            return 1
+        print("✅ Brak regresji względem raportu bazowego.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
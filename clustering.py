@@ -0,0 +1,338 @@
+# CLUSTERING - trenowanie modelu K-means i przypisywanie grup docelowych
+import copy
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from k_sweep import sweep_k
+
+GROUP_COLUMN = "Grupa docelowa"
+GROUP_NAME_COLUMN = "Nazwa grupy"
+# Tryb dużych zbiorów: wielkość próbki treningowej i porcji przy przypisywaniu wszystkich wierszy
+SAMPLE_SIZE = int(os.getenv("ZAPLANUJ_SAMPLE_SIZE", "50000"))
+ASSIGN_CHUNK_ROWS = int(os.getenv("ZAPLANUJ_ASSIGN_CHUNK_ROWS", "100000"))
+# Kolumny kategoryczne o takiej liczbie wartości nadają się do warstwowania próbki
+STRATIFY_MAX_CATEGORIES = 50
+# Silnik klastrowania: "sklearn" (lekki, domyślny) albo "pycaret" (importowany dopiero przy użyciu)
+CLUSTERING_ENGINE = os.getenv("ZAPLANUJ_CLUSTERING_ENGINE", "sklearn")
+# Kolumny kategoryczne kodowane są one-hot; rzadsze wartości ponad ten limit trafiają do wspólnej kategorii
+ONE_HOT_MAX_CATEGORIES = 25
+# Przesunięcie centroidu (średnio na cechę, w jednostkach przeskalowanych danych), od którego grupa uznawana jest za zmienioną
+DRIFT_THRESHOLD = float(os.getenv("ZAPLANUJ_DRIFT_THRESHOLD", "0.25"))
+
+
+def pycaret_available() -> bool:
+    import importlib.util
+    return importlib.util.find_spec("pycaret") is not None
+
+
+class SklearnExperiment:
+    """
+    Lekki odpowiednik ClusteringExperiment PyCaret: imputacja braków, one-hot dla kolumn kategorycznych
+    i standaryzacja w jednym pipeline scikit-learn. Udostępnia get_config("pipeline") i get_config("X_train_transformed").
+    """
+
+    def __init__(self):
+        self._config = {}
+
+    def setup(self, data: pd.DataFrame, normalize: bool = True, session_id: int = 42, **kwargs):
+        numeric_columns = data.select_dtypes(include="number").columns.tolist()
+        categorical_columns = data.select_dtypes(include=["object", "category", "bool"]).columns.tolist()
+
+        numeric_steps = [("impute", SimpleImputer(strategy="mean"))]
+        if normalize:
+            numeric_steps.append(("scale", StandardScaler()))
+        transformers = []
+        if numeric_columns:
+            transformers.append(("numeric", Pipeline(numeric_steps), numeric_columns))
+        if categorical_columns:
+            transformers.append(("categorical", Pipeline([
+                ("impute", SimpleImputer(strategy="most_frequent")),
+                ("one_hot", OneHotEncoder(handle_unknown="infrequent_if_exist", max_categories=ONE_HOT_MAX_CATEGORIES, sparse_output=False))
+            ]), categorical_columns))
+        if not transformers:
+            raise ValueError("Dane nie zawierają kolumn liczbowych ani kategorycznych.")
+
+        pipeline = ColumnTransformer(transformers)
+        self._config = {
+            "pipeline": pipeline,
+            "X_train_transformed": pipeline.fit_transform(data),
+            "seed": session_id
+        }
+        return self
+
+    def get_config(self, name: str):
+        return self._config[name]
+
+
+def create_experiment(data: pd.DataFrame, normalize: bool = True, session_id: int = 42, engine: str = CLUSTERING_ENGINE):
+    """Przygotowuje dane (pipeline przekształceń) wybranym silnikiem"""
+    if engine == "pycaret":
+        from pycaret.clustering import ClusteringExperiment
+        experiment = ClusteringExperiment()
+    elif engine == "sklearn":
+        experiment = SklearnExperiment()
+    else:
+        raise ValueError(f"Nieznany silnik klastrowania: {engine}")
+
+    experiment.setup(
+        data=data,
+        normalize=normalize,
+        verbose=False,
+        session_id=session_id
+    )
+    return experiment
+
+
+class FittedPipeline:
+    """
+    Zapisany pipeline przekształceń (PyCaret lub scikit-learn). Zastępuje experiment tam, gdzie potrzebny jest
+    tylko pipeline (przypisywanie wierszy, aktualizacja przyrostowa) - bez ponownego setup.
+    """
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def get_config(self, name: str):
+        if name != "pipeline":
+            raise KeyError(f"Zapisany projekt nie zawiera ustawienia {name!r}")
+        return self.pipeline
+
+
+def dataframe_fingerprint(df: pd.DataFrame) -> str:
+    """Zwraca skrót SHA-256 zawartości DataFrame (kolumny, typy, indeks i wartości)"""
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps([str(c) for c in df.columns]).encode("utf-8"))
+    hasher.update(json.dumps([str(t) for t in df.dtypes]).encode("utf-8"))
+    hasher.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return hasher.hexdigest()
+
+
+def stratify_column(df: pd.DataFrame):
+    """Kolumna kategoryczna z najmniejszą (ale >= 2) liczbą wartości albo None"""
+    candidates = []
+    for column in df.select_dtypes(include=["category", "object"]).columns:
+        nunique = df[column].nunique(dropna=True)
+        if 2 <= nunique <= STRATIFY_MAX_CATEGORIES:
+            candidates.append((nunique, column))
+    return min(candidates)[1] if candidates else None
+
+
+def sample_rows(df: pd.DataFrame, sample_size: int, seed: int = 42, stratify_by: str = None) -> pd.DataFrame:
+    """
+    Losuje próbkę wierszy bez zwracania. Przy stratify_by każda wartość kolumny
+    jest reprezentowana proporcjonalnie do swojego udziału w całych danych.
+    """
+    if len(df) <= sample_size:
+        return df
+
+    if stratify_by is None:
+        rng = np.random.default_rng(seed)
+        positions = np.sort(rng.choice(len(df), size=sample_size, replace=False))
+        return df.iloc[positions]
+
+    fraction = sample_size / len(df)
+    return (
+        df.groupby(stratify_by, group_keys=False, observed=True, dropna=False)
+        .apply(lambda part: part.sample(n=max(1, int(round(len(part) * fraction))), random_state=seed))
+        .sort_index()
+    )
+
+
+def nearest_centroid(X: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Indeks najbliższego centroidu (odległość euklidesowa) dla każdego wiersza X"""
+    # ||x - c||^2 = ||x||^2 - 2 x·c + ||c||^2, a ||x||^2 nie zmienia wyniku argmin
+    distances = (centers ** 2).sum(axis=1)[np.newaxis, :] - 2.0 * (X @ centers.T)
+    return distances.argmin(axis=1).astype(np.int32)
+
+
+def transform_chunks(experiment, df: pd.DataFrame, chunk_rows: int = ASSIGN_CHUNK_ROWS):
+    """Przetwarza dane porcjami przez pipeline przekształceń; zwraca (pozycja początku porcji, macierz cech)"""
+    pipeline = experiment.get_config("pipeline")
+    for start in range(0, len(df), chunk_rows):
+        yield start, np.asarray(pipeline.transform(df.iloc[start:start + chunk_rows]), dtype=np.float64)
+
+
+def assign_full_population(experiment, model, df: pd.DataFrame, chunk_rows: int = ASSIGN_CHUNK_ROWS) -> np.ndarray:
+    """Przypisuje wszystkie wiersze do centroidów modelu, przetwarzając dane porcjami przez pipeline przekształceń"""
+    centers = np.asarray(model.cluster_centers_, dtype=np.float64)
+    labels = np.empty(len(df), dtype=np.int32)
+
+    for start, X in transform_chunks(experiment, df, chunk_rows):
+        labels[start:start + len(X)] = nearest_centroid(X, centers)
+    return labels
+
+
+def fit_clustering(df: pd.DataFrame, num_groups: int, normalize: bool = True, session_id: int = 42, sample_size: int = None,
+                   engine: str = CLUSTERING_ENGINE):
+    """
+    Trenuje K-means i zwraca (experiment, model, clustered_df) z kolumną "Grupa docelowa".
+    Gdy sample_size jest ustawione i danych jest więcej, MiniBatchKMeans trenowany jest na (warstwowanej) próbce,
+    a wszystkie wiersze przypisywane są do najbliższego centroidu.
+    """
+    train_df = df
+    if sample_size and len(df) > sample_size:
+        train_df = sample_rows(df, sample_size, seed=session_id, stratify_by=stratify_column(df))
+
+    experiment = create_experiment(train_df, normalize=normalize, session_id=session_id, engine=engine)
+    sampled = train_df is not df
+
+    if engine == "pycaret" and not sampled:
+        model = experiment.create_model('kmeans', num_clusters=num_groups)
+        labels = getattr(model, "labels_", None)
+        if labels is None or len(labels) != len(df):
+            # assign_model zwraca własną kopię danych - etykiety odczytujemy z niej ("Cluster 0" -> 0)
+            labels = experiment.assign_model(model)["Cluster"].str.extract(r"(\d+)$", expand=False).astype(np.int32).to_numpy()
+        return experiment, model, label_frame(df, labels, num_groups)
+
+    if sampled:
+        model = MiniBatchKMeans(n_clusters=num_groups, random_state=session_id, n_init=3, batch_size=4096)
+    else:
+        model = KMeans(n_clusters=num_groups, random_state=session_id, n_init="auto")
+
+    if engine == "pycaret":
+        model = experiment.create_model(model, num_clusters=num_groups)
+    else:
+        model.fit(experiment.get_config("X_train_transformed"))
+
+    labels = assign_full_population(experiment, model, df) if sampled else model.labels_
+    return experiment, model, label_frame(df, labels, num_groups)
+
+
+def group_label(label: int) -> str:
+    """Nazwa grupy w tym samym formacie co po assign_model PyCaret ("Cluster 0" -> "Grupa  0")"""
+    return f"Grupa  {label}"
+
+
+def group_labels(labels: np.ndarray, num_groups: int = None) -> pd.Categorical:
+    """
+    Etykiety grup jako kategorie: w każdym wierszu tylko kod (int8 dla mniej niż 128 grup),
+    a nazwy "Grupa  i" przechowywane są raz - zamiast osobnego napisu w każdym wierszu.
+    """
+    labels = np.asarray(labels)
+    k = max(num_groups or 0, int(labels.max()) + 1 if len(labels) else 0)
+    return pd.Categorical.from_codes(labels, categories=[group_label(i) for i in range(k)])
+
+
+def label_frame(df: pd.DataFrame, labels: np.ndarray, num_groups: int = None) -> pd.DataFrame:
+    """
+    Dane z kolumną "Grupa docelowa" (kategorie w formacie assign_model PyCaret).
+    Kolumny df nie są kopiowane - wynik współdzieli z nimi pamięć, więc nie należy go modyfikować w miejscu.
+    """
+    groups = pd.Series(group_labels(labels, num_groups), index=df.index, name=GROUP_COLUMN)
+    return pd.concat([df, groups], axis=1, copy=False)
+
+
+def with_group_names(clustered_df: pd.DataFrame, names: dict) -> pd.DataFrame:
+    """
+    Dane do wyświetlenia z dodatkową kolumną "Nazwa grupy" ("Grupa  0 – nazwa" dla grup z nadaną nazwą).
+    Zmieniane są tylko kategorie - bez napisu w każdym wierszu i bez kopiowania pozostałych kolumn.
+    """
+    groups = clustered_df[GROUP_COLUMN]
+    if not isinstance(groups.dtype, pd.CategoricalDtype):
+        groups = groups.astype("category")
+    # Prefiks z oznaczeniem grupy zapewnia unikalność nazw, nawet gdy dwie grupy dostaną tę samą nazwę
+    display = groups.cat.rename_categories([f"{group} – {names[group]}" if names.get(group) else group for group in groups.cat.categories])
+    return pd.concat([clustered_df, display.rename(GROUP_NAME_COLUMN)], axis=1, copy=False)
+
+
+def fit_k_candidates(df: pd.DataFrame, k_values, normalize: bool = True, session_id: int = 42, sample_size: int = None,
+                     engine: str = CLUSTERING_ENGINE):
+    """
+    Przygotowuje dane raz (pipeline przekształceń na próbce) i trenuje modele dla wszystkich k równolegle.
+    Zwraca (experiment, {k: {"model", "inertia", "silhouette", "calinski_harabasz"}}).
+    """
+    train_df = df
+    if sample_size and len(df) > sample_size:
+        train_df = sample_rows(df, sample_size, seed=session_id, stratify_by=stratify_column(df))
+
+    experiment = create_experiment(train_df, normalize=normalize, session_id=session_id, engine=engine)
+    X = np.asarray(experiment.get_config("X_train_transformed"), dtype=np.float64)
+    return experiment, sweep_k(X, k_values, session_id=session_id)
+
+
+def clustering_for_candidate(experiment, model, df: pd.DataFrame) -> pd.DataFrame:
+    """Przypisuje wszystkie wiersze do grup modelu z przeglądu k (bez ponownego trenowania)"""
+    return label_frame(df, assign_full_population(experiment, model, df), len(model.cluster_centers_))
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """
+    Skrót każdego wiersza (bez indeksu). Liczby są najpierw rozszerzane do int64/float64,
+    bo wczytywanie zmniejsza typy osobno dla każdego pliku.
+    """
+    widened = {}
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_integer_dtype(values) and not pd.api.types.is_extension_array_dtype(values):
+            values = values.astype(np.int64)
+        elif pd.api.types.is_float_dtype(values):
+            values = values.astype(np.float64)
+        widened[column] = values
+    return pd.util.hash_pandas_object(pd.DataFrame(widened, index=df.index), index=False).to_numpy()
+
+
+def appended_rows(df: pd.DataFrame, previous_hashes: np.ndarray, previous_columns: list):
+    """Nowe wiersze, gdy df to poprzednie dane z wierszami dopisanymi na końcu; w przeciwnym razie None"""
+    n = len(previous_hashes)
+    if list(df.columns) != list(previous_columns) or len(df) <= n:
+        return None
+    if not np.array_equal(row_hashes(df.iloc[:n]), previous_hashes):
+        return None
+    return df.iloc[n:]
+
+
+def update_clustering(experiment, model, clustered_df: pd.DataFrame, new_rows: pd.DataFrame, partial_fit: bool = True,
+                      drift_threshold: float = DRIFT_THRESHOLD):
+    """
+    Przypisuje dopisane wiersze do istniejących grup pipeline'em (i skalerem) poprzedniego dopasowania - bez setup i create_model.
+    Przy partial_fit centroidy przesuwane są średnią ważoną starych i nowych wierszy (krok K-means online);
+    bez niego model się nie zmienia, ale dryf (przesunięcie, jakie dałyby nowe wiersze) jest raportowany tak samo.
+    Zwraca (model, clustered_df, raport dryfu); raport["moved"] to grupy, których centroid przesunął się o więcej niż drift_threshold.
+    """
+    centers = np.asarray(model.cluster_centers_, dtype=np.float64)
+    k = len(centers)
+    labels = np.empty(len(new_rows), dtype=np.int32)
+    sums = np.zeros_like(centers)
+
+    for start, X in transform_chunks(experiment, new_rows):
+        chunk_labels = nearest_centroid(X, centers)
+        labels[start:start + len(X)] = chunk_labels
+        np.add.at(sums, chunk_labels, X)
+
+    groups = [group_label(label) for label in range(k)]
+    old_counts = clustered_df[GROUP_COLUMN].value_counts().reindex(groups, fill_value=0).to_numpy(dtype=np.float64)
+    new_counts = np.bincount(labels, minlength=k).astype(np.float64)
+
+    # Centroid grupy po dołączeniu nowych wierszy (średnia ważona starych i nowych) - dryf liczony jest zawsze,
+    # także gdy centroidy modelu zostają bez zmian
+    total = (old_counts + new_counts)[:, np.newaxis]
+    updated_centers = np.where(total > 0, (old_counts[:, np.newaxis] * centers + sums) / np.maximum(total, 1), centers)
+    # Średnie przesunięcie na cechę (RMS) - niezależne od liczby kolumn po przekształceniu
+    shifts = np.sqrt(((updated_centers - centers) ** 2).mean(axis=1))
+
+    updated_model = model
+    if partial_fit:
+        updated_model = copy.deepcopy(model)
+        updated_model.cluster_centers_ = updated_centers.astype(model.cluster_centers_.dtype)
+
+    report = {
+        "new_rows": len(new_rows),
+        "threshold": drift_threshold,
+        "new_counts": dict(zip(groups, new_counts.astype(int).tolist())),
+        "shifts": dict(zip(groups, shifts.tolist())),
+        "moved": [group for group, shift in zip(groups, shifts) if shift > drift_threshold]
+    }
+    updated_df = pd.concat([clustered_df, label_frame(new_rows, labels, k)])
+    if not isinstance(updated_df[GROUP_COLUMN].dtype, pd.CategoricalDtype):
+        # Różne zestawy kategorii (np. projekt zapisany z tekstową kolumną grupy) - concat daje tekst
+        updated_df[GROUP_COLUMN] = updated_df[GROUP_COLUMN].astype("category")
+    return updated_model, updated_df, report
@@ -0,0 +1,201 @@
+# FAKE OPENAI - lokalny serwer imitujący API OpenAI do testów bez sieci i bez kosztów
+#
+# Uruchomienie:
+#   python fake_openai.py --port 8765 --latency 1.5
+#   python fake_openai.py --rate-limit-every 3 --retry-after 2   # co trzecie zapytanie kończy się 429
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+import argparse
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_completion_text(prompt: str, json_mode: bool = False) -> str:
+    """Deterministyczna odpowiedź zależna od treści promptu"""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:6]
+    if json_mode:
+        groups = re.findall(r"^\s*Grupa: (.+)$", prompt, flags=re.MULTILINE)
+        return json.dumps({"groups": [
+            {"group": group.strip(), "name": f"Segment {digest}-{i}", "description": f"Przykładowy opis grupy {group.strip()}."}
+            for i, group in enumerate(groups)
+        ]}, ensure_ascii=False)
+    if "NAZWA:" in prompt:
+        return f"NAZWA: Segment {digest}\nOPIS: Przykładowy opis grupy wygenerowany lokalnie ({digest})."
+    return (
+        f"1. **Slogan:** Kampania {digest}\n"
+        "2. **Post:** Przykładowa treść posta na media społecznościowe.\n"
+        "3. **Kreacja:** Jasne kolory, uśmiechnięty bohater.\n"
+        "4. **Medium:** Instagram - największy zasięg w grupie."
+    )
+
+
+def fake_usage(prompt: str, text: str) -> dict:
+    """Przybliżone zużycie tokenów (ok. 4 znaki na token)"""
+    return {
+        "prompt_tokens": len(prompt) // 4,
+        "completion_tokens": len(text) // 4,
+        "total_tokens": (len(prompt) + len(text)) // 4
+    }
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_rate_limit(self):
+        """Odpowiedź 429 jak z API OpenAI, z nagłówkami Retry-After"""
+        body = json.dumps({"error": {
+            "message": "Rate limit reached for requests (fake).",
+            "type": "requests",
+            "code": "rate_limit_exceeded"
+        }}).encode("utf-8")
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.server.retry_after is not None:
+            self.send_header("Retry-After", f"{self.server.retry_after:g}")
+            self.send_header("retry-after-ms", str(int(self.server.retry_after * 1000)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, request: dict, prompt: str, text: str):
+        """Odpowiedź server-sent events - opóźnienie rozłożone na kolejne fragmenty tekstu"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+
+        words = re.findall(r"\S+\s*", text) or [text]
+        for word in words:
+            time.sleep(self.server.latency / len(words))
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini"),
+                "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "gpt-4o-mini"),
+                "choices": [],
+                "usage": fake_usage(prompt, text)
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path.endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "owned_by": "fake"}]})
+        elif "/models/" in path:
+            self._send_json(200, {"id": path.rsplit("/", 1)[1], "object": "model", "created": 0, "owned_by": "fake"})
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        prompt = "\n".join(str(m.get("content", "")) for m in request.get("messages", []))
+
+        with self.server.lock:
+            self.server.request_count += 1
+            rate_limited = self.server.rate_limit_every and self.server.request_count % self.server.rate_limit_every == 0
+            if rate_limited:
+                self.server.rate_limited_count += 1
+        if rate_limited:
+            self._send_rate_limit()
+            return
+
+        json_mode = (request.get("response_format") or {}).get("type") == "json_object"
+        text = fake_completion_text(prompt, json_mode)
+
+        if request.get("stream"):
+            self._send_stream(request, prompt, text)
+            return
+
+        time.sleep(self.server.latency)
+        self._send_json(200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop"
+            }],
+            "usage": fake_usage(prompt, text)
+        })
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """
+    Serwer HTTP z konfigurowalnym opóźnieniem odpowiedzi. Port 0 = losowy wolny port.
+    rate_limit_every=n odpowiada 429 na co n-te zapytanie (z Retry-After, jeśli retry_after nie jest None).
+    """
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, rate_limit_every: int = 0,
+                 retry_after: float = None):
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.request_count = 0
+        self.rate_limited_count = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokalny serwer imitujący API OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=1.0, help="opóźnienie odpowiedzi w sekundach")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="co które zapytanie odpowiada 429 (0 - nigdy)")
+    parser.add_argument("--retry-after", type=float, default=None, help="wartość nagłówka Retry-After w odpowiedziach 429")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, args.latency, args.rate_limit_every, args.retry_after)
+    print(f"Fake OpenAI API: {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
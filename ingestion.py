@@ -0,0 +1,134 @@
+# INGESTION - wczytywanie CSV z limitem rozmiaru i optymalizacją typów
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+INGEST_MAX_BYTES = int(float(os.getenv("ZAPLANUJ_MAX_UPLOAD_MB", "200")) * 1024 * 1024)
+INGEST_MAX_ROWS = int(os.getenv("ZAPLANUJ_MAX_ROWS", "2000000"))
+INGEST_CHUNK_ROWS = int(os.getenv("ZAPLANUJ_CHUNK_ROWS", "100000"))
+# Początek pliku, z którego szacowana jest liczba wierszy przed wyborem parsera
+INGEST_SAMPLE_BYTES = 1024 * 1024
+# Kolumna tekstowa staje się category, gdy unikalnych wartości jest najwyżej tyle (ułamek liczby wierszy)
+CATEGORY_MAX_RATIO = 0.5
+
+
+class DataBudgetError(ValueError):
+    """Dane przekraczają skonfigurowany limit rozmiaru"""
+
+
+class TextChunkReader:
+    """Udostępnia tekst jako plik czytany fragmentami - bez kopiowania całego bufora jak StringIO"""
+
+    def __init__(self, text: str):
+        self._text = text
+        self._position = 0
+
+    def read(self, size: int = -1) -> str:
+        start = self._position
+        end = len(self._text) if size is None or size < 0 else min(start + size, len(self._text))
+        self._position = end
+        return self._text[start:end]
+
+
+def downcast_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """Zmniejsza typy liczbowe (np. int64 -> int16, float64 -> float32)"""
+    for column in df.select_dtypes(include="number").columns:
+        downcast = "integer" if pd.api.types.is_integer_dtype(df[column]) else "float"
+        df[column] = pd.to_numeric(df[column], downcast=downcast)
+    return df
+
+
+def categorize_strings(df: pd.DataFrame, max_ratio: float = CATEGORY_MAX_RATIO) -> pd.DataFrame:
+    """Zamienia kolumny tekstowe o małej liczbie unikalnych wartości na category"""
+    for column in df.select_dtypes(include="object").columns:
+        if len(df) and df[column].nunique(dropna=True) <= max(1, max_ratio * len(df)):
+            df[column] = df[column].astype("category")
+    return df
+
+
+def estimate_rows(source, size_bytes: int, sample_bytes: int = INGEST_SAMPLE_BYTES) -> float:
+    """Szacunkowa liczba wierszy danych (bez nagłówka) z długości wierszy na początku pliku - bez czytania całości"""
+    sample = source.read(sample_bytes)
+    source.seek(0)
+    lines = sample.count(b"\n")
+    if len(sample) < sample_bytes:
+        # Cały plik zmieścił się w próbce - liczba wierszy jest dokładna
+        return lines - 1 + (not sample.endswith(b"\n"))
+    return size_bytes * lines / len(sample) - 1
+
+
+def _read_chunks(source, max_rows: int, chunksize: int):
+    """Czyta CSV porcjami, zmniejszając typy każdej porcji od razu po wczytaniu"""
+    chunks, rows, truncated = [], 0, False
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        if rows + len(chunk) > max_rows:
+            chunk = chunk.iloc[:max_rows - rows]
+            truncated = True
+        chunks.append(downcast_numeric(chunk))
+        rows += len(chunk)
+        if truncated:
+            break
+    return pd.concat(chunks, ignore_index=True), truncated
+
+
+def read_csv_budgeted(source, size_bytes: int = None, max_rows: int = INGEST_MAX_ROWS, max_bytes: int = INGEST_MAX_BYTES,
+                      chunksize: int = INGEST_CHUNK_ROWS, text: bool = False):
+    """
+    Wczytuje CSV z pliku binarnego (lub tekstu, gdy text=True) w granicach limitu bajtów i wierszy.
+    Zwraca (DataFrame, raport). Przekroczenie limitu bajtów zgłasza DataBudgetError,
+    a nadmiarowe wiersze są odcinane (raport["truncated"]).
+    """
+    if size_bytes is None and not text and hasattr(source, "seek"):
+        source.seek(0, os.SEEK_END)
+        size_bytes = source.tell()
+    if size_bytes is not None and size_bytes > max_bytes:
+        raise DataBudgetError(
+            f"Dane mają {size_bytes / 1024 / 1024:.1f} MB, a limit wynosi {max_bytes / 1024 / 1024:.0f} MB."
+        )
+
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+    # Silnik pyarrow czyta wielowątkowo prosto do kolumn, ale nie obsługuje porcji - wczytałby cały plik przed odcięciem
+    # nadmiarowych wierszy. Gdy z początku pliku wynika, że wierszy jest więcej niż limit, czytamy porcjami do limitu.
+    df = None
+    if PYARROW_AVAILABLE and not text and (size_bytes is None or estimate_rows(source, size_bytes) <= max_rows):
+        try:
+            engine = "pyarrow"
+            df = pd.read_csv(source, engine="pyarrow")
+            truncated = len(df) > max_rows
+            if truncated:
+                df = df.iloc[:max_rows].copy()
+            df = downcast_numeric(df)
+        except Exception:
+            # Plik, z którym pyarrow sobie nie radzi, próbujemy jeszcze standardowym parserem
+            df = None
+            source.seek(0)
+
+    if df is None:
+        engine = "c"
+        df, truncated = _read_chunks(source, max_rows, chunksize)
+
+    df = categorize_strings(df)
+
+    report = {
+        "rows": len(df),
+        "columns": df.shape[1],
+        "engine": engine,
+        "truncated": truncated,
+        "max_rows": max_rows,
+        "memory_bytes": int(df.memory_usage(deep=True).sum())
+    }
+    return df, report
+
+
+def read_csv_text(raw_text: str, **kwargs):
+    """Wczytuje wklejony tekst CSV (bez kopii całego bufora)"""
+    # Długość w znakach jako przybliżenie rozmiaru - encode() utworzyłby kolejną kopię tekstu
+    return read_csv_budgeted(TextChunkReader(raw_text), size_bytes=len(raw_text), text=True, **kwargs)
@@ -0,0 +1,60 @@
+# K SWEEP - równoległy przegląd liczby grup (k) dla K-means
+# Moduł celowo importuje tylko numpy i scikit-learn, żeby procesy robocze startowały szybko.
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.cluster import KMeans
+from sklearn.metrics import calinski_harabasz_score, silhouette_score
+
+K_SWEEP_WORKERS = int(os.getenv("ZAPLANUJ_K_SWEEP_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+SILHOUETTE_SAMPLE = int(os.getenv("ZAPLANUJ_SILHOUETTE_SAMPLE", "5000"))
+
+
+def fit_candidate(X: np.ndarray, k: int, session_id: int = 42, silhouette_sample: int = SILHOUETTE_SAMPLE) -> dict:
+    """Trenuje K-means dla jednego k i liczy miary jakości (silhouette na próbce, Calinski-Harabasz, inercja)"""
+    model = KMeans(n_clusters=k, random_state=session_id, n_init="auto")
+    labels = model.fit_predict(X)
+    sample = min(silhouette_sample, len(X))
+    return {
+        "k": k,
+        "model": model,
+        "inertia": float(model.inertia_),
+        "silhouette": float(silhouette_score(X, labels, sample_size=sample, random_state=session_id)),
+        "calinski_harabasz": float(calinski_harabasz_score(X, labels))
+    }
+
+
+def sweep_k(X: np.ndarray, k_values, session_id: int = 42, max_workers: int = K_SWEEP_WORKERS) -> dict:
+    """
+    Trenuje modele dla wszystkich k w osobnych procesach (spawn - bezpieczny przy wielu wątkach serwera).
+    Zwraca {k: wynik fit_candidate}; przy max_workers <= 1 liczy sekwencyjnie w bieżącym procesie.
+    """
+    k_values = [k for k in k_values if 2 <= k < len(X)]
+    if max_workers <= 1 or len(k_values) <= 1:
+        return {k: fit_candidate(X, k, session_id) for k in k_values}
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(k_values)), mp_context=context) as executor:
+        futures = {k: executor.submit(fit_candidate, X, k, session_id) for k in k_values}
+        return {k: future.result() for k, future in futures.items()}
+
+
+def elbow_k(candidates: dict):
+    """k w "łokciu" krzywej inercji - punkt najdalej od prostej łączącej skrajne punkty"""
+    ks = sorted(candidates)
+    if len(ks) < 3:
+        return ks[0] if ks else None
+    points = np.array([[k, candidates[k]["inertia"]] for k in ks], dtype=np.float64)
+    points = (points - points.min(axis=0)) / np.ptp(points, axis=0).clip(min=1e-12)
+    start, end = points[0], points[-1]
+    direction = (end - start) / np.linalg.norm(end - start)
+    offsets = points - start
+    distances = np.abs(offsets[:, 0] * direction[1] - offsets[:, 1] * direction[0])
+    return ks[int(distances.argmax())]
+
+
+def recommend_k(candidates: dict):
+    """Najlepsze k według silhouette (przy remisie - wyższy Calinski-Harabasz)"""
+    return max(candidates, key=lambda k: (round(candidates[k]["silhouette"], 4), candidates[k]["calinski_harabasz"]))
@@ -0,0 +1,403 @@
+# LLM - generowanie nazw, opisów grup i kampanii reklamowych
+import asyncio
+import json
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from llm_cache import get_llm_cache
+from llm_gateway import get_llm_gateway
+from metrics import get_metrics
+
+LLM_MODEL = "gpt-4o-mini"
+LLM_TEMPERATURE = 0
+# Limit równoległych zapytań i timeout pojedynczego zapytania (w sekundach)
+LLM_MAX_WORKERS = int(os.getenv("ZAPLANUJ_LLM_WORKERS", "4"))
+LLM_TIMEOUT = float(os.getenv("ZAPLANUJ_LLM_TIMEOUT", "60"))
+# Tryb wsadowy: limity jednego zapytania z opisami wielu grup
+LLM_BATCH_MAX_GROUPS = int(os.getenv("ZAPLANUJ_LLM_BATCH_GROUPS", "10"))
+LLM_BATCH_MAX_CHARS = int(os.getenv("ZAPLANUJ_LLM_BATCH_CHARS", "24000"))
+
+
+# ---PROMPTS---
+def build_description_prompt(description_stat: str, nr_group) -> str:
+    return f"""
+    Jesteś specjalistą ds. marketingu. Oto dane statystyczne użytkowników z grupy {nr_group}:
+    {description_stat}
+
+    Na podstawie tych danych:
+    1. Wymyśl nazwę tej grupy (krótka, chwytliwa, marketingowa).
+    2. Napisz krótki opis (2-3 zdania), czym się ta grupa charakteryzuje.
+
+    Zwróć odpowiedź w formacie:
+    NAZWA: ...
+    OPIS: ...
+    """
+
+
+def build_batch_description_prompt(group_stats: dict) -> str:
+    sections = "\n\n".join(f"Grupa: {group}\n{stat}" for group, stat in group_stats.items())
+    return f"""
+    Jesteś specjalistą ds. marketingu. Oto dane statystyczne użytkowników z kilku grup:
+
+    {sections}
+
+    Dla każdej grupy:
+    1. Wymyśl nazwę tej grupy (krótka, chwytliwa, marketingowa).
+    2. Napisz krótki opis (2-3 zdania), czym się ta grupa charakteryzuje.
+
+    Zwróć wyłącznie obiekt JSON w formacie:
+    {{"groups": [{{"group": "<oznaczenie grupy>", "name": "...", "description": "..."}}]}}
+    """
+
+
+def build_campaign_prompt(campain_goal: str, group, name: str, description: str) -> str:
+    return f"""
+    Jesteś specjalistą ds. marketingu. Twoim zadaniem jest przygotować kampanię reklamową dopasowaną do grupy docelowej.
+
+    Cel kampanii: {campain_goal}
+
+    Grupa docelowa: {group}
+    Nazwa grupy: {name}
+    Opis grupy: {description}
+
+    Przygotuj:
+    1. Slogan reklamowy (krótki, chwytliwy, max 10 słów)
+    2. Treść posta na media społecznościowe (2-3 zdania)
+    3. Propozycję kreacji graficznej (opisz jak mogłaby wyglądać reklama: kolorystyka, motyw, bohater itp.)
+    4. Propozycję medium reklamy (np. Instagram, TikTok, baner, mailing itp.) i uzasadnienie
+
+    Zwróć odpowiedź w przejrzystym formacie z punktami.
+    """
+
+
+# ---COMPLETIONS---
+def _create_completion(openai_client, **kwargs):
+    """chat.completions.create przez wspólną bramkę: (odpowiedź, liczba ponowień, czy połączono z identycznym zapytaniem)"""
+    return get_llm_gateway().create(openai_client, **kwargs)
+
+
+async def _acreate_completion(async_client, **kwargs):
+    return await get_llm_gateway().acreate(async_client, **kwargs)
+
+
+def _record_usage(event: dict, usage):
+    if usage is not None:
+        event["prompt_tokens"] = usage.prompt_tokens
+        event["completion_tokens"] = usage.completion_tokens
+
+
+def complete(openai_client, prompt: str, timeout: float = LLM_TIMEOUT, use_cache: bool = True, response_format: dict = None,
+             stage: str = "llm") -> str:
+    # Przy temperature=0 ten sam prompt daje tę samą odpowiedź - powtórki bierzemy z cache
+    cache = get_llm_cache() if use_cache else None
+    with get_metrics().measure(stage) as event:
+        if cache is not None:
+            cached = cache.get(LLM_MODEL, LLM_TEMPERATURE, prompt)
+            if cached is not None:
+                event["cache_hit"] = True
+                return cached
+
+        response, event["retries"], event["coalesced"] = _create_completion(
+            openai_client,
+            model=LLM_MODEL,
+            temperature=LLM_TEMPERATURE,
+            messages=[{"role": "user", "content": prompt}],
+            timeout=timeout,
+            **({"response_format": response_format} if response_format else {})
+        )
+        if not event["coalesced"]:
+            # Tokeny połączonego zapytania zostały już policzone przy pierwszym z nich
+            _record_usage(event, response.usage)
+        text = response.choices[0].message.content.strip()
+
+    if cache is not None:
+        cache.set(LLM_MODEL, LLM_TEMPERATURE, prompt, text)
+    return text
+
+
+def stream_complete(openai_client, prompt: str, timeout: float = LLM_TIMEOUT, use_cache: bool = True, cancel_event: threading.Event = None,
+                    stage: str = "llm"):
+    """
+    Zwraca kolejne fragmenty odpowiedzi (stream=True). Trafienie w cache zwraca całą odpowiedź jednym fragmentem.
+    Ustawienie cancel_event przerywa strumień - niepełna odpowiedź nie trafia do cache.
+    """
+    cache = get_llm_cache() if use_cache else None
+    with get_metrics().measure(stage, stream=True) as event:
+        if cache is not None:
+            cached = cache.get(LLM_MODEL, LLM_TEMPERATURE, prompt)
+            if cached is not None:
+                event["cache_hit"] = True
+                yield cached
+                return
+
+        stream, event["retries"], _ = _create_completion(
+            openai_client,
+            model=LLM_MODEL,
+            temperature=LLM_TEMPERATURE,
+            messages=[{"role": "user", "content": prompt}],
+            timeout=timeout,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        parts = []
+        try:
+            for chunk in stream:
+                if cancel_event is not None and cancel_event.is_set():
+                    event["cancelled"] = True
+                    return
+                _record_usage(event, getattr(chunk, "usage", None))
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        finally:
+            stream.close()
+
+    if cache is not None:
+        cache.set(LLM_MODEL, LLM_TEMPERATURE, prompt, "".join(parts).strip())
+
+
+def generate_group_descriptions(openai_client, group_profile: str, nr_group, timeout: float = LLM_TIMEOUT) -> str:
+    return complete(openai_client, build_description_prompt(group_profile, nr_group), timeout=timeout, stage="llm.description")
+
+
+def generate_campaign(openai_client, campain_goal, group, name, description, timeout: float = LLM_TIMEOUT) -> str:
+    return complete(openai_client, build_campaign_prompt(campain_goal, group, name, description), timeout=timeout, stage="llm.campaign")
+
+
+def stream_campaign(openai_client, campain_goal, group, name, description, timeout: float = LLM_TIMEOUT, cancel_event: threading.Event = None):
+    return stream_complete(
+        openai_client,
+        build_campaign_prompt(campain_goal, group, name, description),
+        timeout=timeout,
+        cancel_event=cancel_event,
+        stage="llm.campaign"
+    )
+
+
+def parse_group_description(text: str, group):
+    """Wyciąga nazwę i opis grupy z odpowiedzi w formacie NAZWA: ... OPIS: ..."""
+    if "NAZWA:" in text and "OPIS:" in text:
+        try:
+            name_part, description_part = text.split("OPIS:", 1)
+            name = name_part.split("NAZWA:", 1)[1].strip()
+            description = description_part.strip()
+        except Exception:
+            name, description = f"Grupa {group}", "Opis niedostępny."
+    else:
+        name = f"Grupa {group}"
+        description = text.strip() or "Brak opisu."
+    return name, description
+
+
+# ---BATCH DESCRIPTIONS---
+def parse_batch_descriptions(text: str, expected_groups) -> dict:
+    """
+    Waliduje odpowiedź {"groups": [{"group", "name", "description"}, ...]}.
+    Zwraca {grupa: (nazwa, opis)} tylko dla poprawnych wpisów oczekiwanych grup.
+    """
+    payload = json.loads(text)
+    items = payload.get("groups") if isinstance(payload, dict) else payload
+    if not isinstance(items, list):
+        raise ValueError("Odpowiedź nie zawiera listy grup.")
+
+    expected = {str(group): group for group in expected_groups}
+    results = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        group = expected.get(str(item.get("group", "")).strip())
+        name = item.get("name")
+        description = item.get("description")
+        if group is None or not isinstance(name, str) or not isinstance(description, str) or not name.strip():
+            continue
+        results[group] = (name.strip(), description.strip() or "Brak opisu.")
+    return results
+
+
+def plan_description_batches(group_stats: dict, max_groups: int = LLM_BATCH_MAX_GROUPS, max_chars: int = LLM_BATCH_MAX_CHARS) -> list:
+    """Dzieli grupy na paczki mieszczące się w limicie liczby grup i długości promptu"""
+    batches, current, current_chars = [], {}, 0
+    for group, stat in group_stats.items():
+        if current and (len(current) >= max_groups or current_chars + len(stat) > max_chars):
+            batches.append(current)
+            current, current_chars = {}, 0
+        current[group] = stat
+        current_chars += len(stat)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def generate_group_descriptions_batch(openai_client, group_stats: dict, timeout: float = LLM_TIMEOUT) -> dict:
+    """
+    Generuje nazwy i opisy wielu grup jednym zapytaniem.
+    Grupy pominięte lub błędne w odpowiedzi (albo całe nieudane zapytanie) są generowane pojedynczo.
+    """
+    results = {}
+    if len(group_stats) > 1:
+        try:
+            text = complete(
+                openai_client,
+                build_batch_description_prompt(group_stats),
+                timeout=timeout,
+                response_format={"type": "json_object"},
+                stage="llm.description_batch"
+            )
+            results = parse_batch_descriptions(text, group_stats.keys())
+        except Exception:
+            results = {}
+
+    for group, stat in group_stats.items():
+        if group not in results:
+            text = complete(openai_client, build_description_prompt(stat, group), timeout=timeout, stage="llm.description")
+            results[group] = parse_group_description(text, group)
+    return results
+
+
+def description_tasks(openai_client, group_stats: dict, batch: bool = True, timeout: float = LLM_TIMEOUT) -> dict:
+    """
+    Przygotowuje zadania dla run_concurrently: {krotka grup: funkcja zwracająca {grupa: (nazwa, opis)}}.
+    W trybie wsadowym jedno zadanie obejmuje całą paczkę grup, w przeciwnym razie jedną grupę.
+    """
+    batches = plan_description_batches(group_stats) if batch else [{group: stat} for group, stat in group_stats.items()]
+    return {
+        tuple(chunk): partial(generate_group_descriptions_batch, openai_client, chunk, timeout)
+        for chunk in batches
+    }
+
+
+# ---ASYNC---
+async def acomplete(async_client, prompt: str, timeout: float = LLM_TIMEOUT, use_cache: bool = True, response_format: dict = None,
+                    stage: str = "llm") -> str:
+    """Odpowiednik complete() dla AsyncOpenAI - ten sam cache, te same parametry zapytania i metryki"""
+    cache = get_llm_cache() if use_cache else None
+    with get_metrics().measure(stage) as event:
+        if cache is not None:
+            cached = cache.get(LLM_MODEL, LLM_TEMPERATURE, prompt)
+            if cached is not None:
+                event["cache_hit"] = True
+                return cached
+
+        response, event["retries"], event["coalesced"] = await _acreate_completion(
+            async_client,
+            model=LLM_MODEL,
+            temperature=LLM_TEMPERATURE,
+            messages=[{"role": "user", "content": prompt}],
+            timeout=timeout,
+            **({"response_format": response_format} if response_format else {})
+        )
+        if not event["coalesced"]:
+            # Tokeny połączonego zapytania zostały już policzone przy pierwszym z nich
+            _record_usage(event, response.usage)
+        text = response.choices[0].message.content.strip()
+
+    if cache is not None:
+        cache.set(LLM_MODEL, LLM_TEMPERATURE, prompt, text)
+    return text
+
+
+async def agenerate_group_descriptions(async_client, group_stats: dict, batch: bool = True, timeout: float = LLM_TIMEOUT) -> dict:
+    """
+    Nazwy i opisy wszystkich grup: paczki (lub pojedyncze grupy) wysyłane są współbieżnie,
+    a grupy brakujące w odpowiedzi wsadowej generowane są pojedynczo. Zwraca {grupa: (nazwa, opis)}.
+    """
+    async def describe_batch(chunk: dict) -> dict:
+        results = {}
+        if len(chunk) > 1:
+            try:
+                text = await acomplete(
+                    async_client,
+                    build_batch_description_prompt(chunk),
+                    timeout=timeout,
+                    response_format={"type": "json_object"},
+                    stage="llm.description_batch"
+                )
+                results = parse_batch_descriptions(text, chunk.keys())
+            except Exception:
+                results = {}
+
+        missing = [group for group in chunk if group not in results]
+        texts = await asyncio.gather(*(
+            acomplete(async_client, build_description_prompt(chunk[group], group), timeout=timeout, stage="llm.description")
+            for group in missing
+        ))
+        for group, text in zip(missing, texts):
+            results[group] = parse_group_description(text, group)
+        return results
+
+    batches = plan_description_batches(group_stats) if batch else [{group: stat} for group, stat in group_stats.items()]
+    results = {}
+    for chunk_results in await asyncio.gather(*(describe_batch(chunk) for chunk in batches)):
+        results.update(chunk_results)
+    return results
+
+
+async def agenerate_campaign(async_client, campain_goal, group, name, description, timeout: float = LLM_TIMEOUT) -> str:
+    return await acomplete(async_client, build_campaign_prompt(campain_goal, group, name, description), timeout=timeout, stage="llm.campaign")
+
+
+# ---CONCURRENCY---
+def run_concurrently(tasks: dict, max_workers: int = LLM_MAX_WORKERS):
+    """
+    Uruchamia zadania {klucz: funkcja bez argumentów} w ograniczonej puli wątków.
+    Zwraca pary (klucz, wynik) w kolejności ukończenia - wyjątek zadania zwracany jest jako wynik.
+    Przerwanie iteracji (np. rerun Streamlit) anuluje zadania, które jeszcze nie wystartowały.
+    """
+    if not tasks:
+        return
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks))))
+    try:
+        futures = {executor.submit(task): key for key, task in tasks.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                yield key, future.result()
+            except Exception as e:
+                yield key, e
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def stream_concurrently(streams: dict, max_workers: int = LLM_MAX_WORKERS):
+    """
+    Odczytuje strumienie {klucz: funkcja(cancel_event) zwracająca fragmenty} w ograniczonej puli wątków.
+    Zwraca zdarzenia (klucz, fragment, None) dla kolejnych fragmentów oraz (klucz, None, wynik)
+    po zakończeniu strumienia - wynik to pełny tekst albo wyjątek.
+    Przerwanie iteracji (np. zmiana danych przez użytkownika) zamyka wszystkie otwarte strumienie.
+    """
+    if not streams:
+        return
+
+    events = queue.Queue()
+    cancel_event = threading.Event()
+
+    def consume(key, open_stream):
+        parts = []
+        try:
+            for delta in open_stream(cancel_event=cancel_event):
+                if cancel_event.is_set():
+                    return
+                parts.append(delta)
+                events.put((key, delta, None))
+            events.put((key, None, "".join(parts).strip()))
+        except Exception as e:
+            events.put((key, None, e))
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(streams))))
+    try:
+        for key, open_stream in streams.items():
+            executor.submit(consume, key, open_stream)
+
+        remaining = len(streams)
+        while remaining:
+            event = events.get()
+            if event[1] is None:
+                remaining -= 1
+            yield event
+    finally:
+        cancel_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
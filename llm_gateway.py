@@ -0,0 +1,300 @@
+# LLM GATEWAY - wspólna dla procesu bramka do chat.completions: limity RPM/TPM, ponowienia z backoffem
+# i łączenie identycznych zapytań wysyłanych jednocześnie (np. z kilku sesji)
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+from email.utils import parsedate_to_datetime
+
+import openai
+
+from openai_pool import api_key_hash
+from profiling import estimate_tokens
+
+# Limity konta OpenAI na minutę (0 - bez limitu po stronie aplikacji)
+LLM_RPM = int(os.getenv("ZAPLANUJ_LLM_RPM", "500"))
+LLM_TPM = int(os.getenv("ZAPLANUJ_LLM_TPM", "200000"))
+# Ponowienia po 429 i błędach przejściowych: wykładniczy backoff z losowym rozrzutem (w sekundach)
+LLM_MAX_RETRIES = int(os.getenv("ZAPLANUJ_LLM_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("ZAPLANUJ_LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("ZAPLANUJ_LLM_BACKOFF_MAX", "30"))
+# Szacunek długości odpowiedzi, gdy zapytanie nie podaje max_tokens (korygowany po otrzymaniu usage)
+COMPLETION_TOKENS_ESTIMATE = 500
+RETRYABLE_STATUS = (408, 409, 429)
+
+
+class TokenBucket:
+    """
+    Limit na minutę uzupełniany w sposób ciągły. reserve() pobiera od razu (poziom może zejść poniżej zera)
+    i zwraca czas oczekiwania - kolejne zapytania ustawiają się w kolejce za wcześniejszymi.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            self.level -= min(float(amount), self.capacity)
+            return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount: float):
+        """Korekta po fakcie: dodatnia wartość oddaje pobrane wcześniej jednostki (np. szacunek tokenów był za duży)"""
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+def request_tokens(kwargs: dict) -> int:
+    """Szacunek tokenów zapytania: prompt + max_tokens (albo typowa długość odpowiedzi)"""
+    prompt = "\n".join(str(message.get("content", "")) for message in kwargs.get("messages", []))
+    return estimate_tokens(prompt) + int(kwargs.get("max_tokens") or COMPLETION_TOKENS_ESTIMATE)
+
+
+def request_key(client, kwargs: dict) -> str:
+    """
+    Skrót zapytania (adres API, skrót klucza API i parametry bez timeout) - identyczne zapytania w locie są łączone.
+    Klucz API wchodzi do skrótu, żeby sesje z różnymi kluczami nie dostawały cudzych odpowiedzi ani błędów.
+    """
+    payload = json.dumps({key: value for key, value in kwargs.items() if key != "timeout"}, sort_keys=True, default=str)
+    api_key = api_key_hash(str(getattr(client, "api_key", "") or ""))
+    return hashlib.sha256(f"{getattr(client, 'base_url', '')}\x00{api_key}\x00{payload}".encode("utf-8")).hexdigest()
+
+
+def is_retryable(error: Exception) -> bool:
+    """429, przekroczony czas, błędy połączenia i 5xx - ale nie brak środków na koncie (insufficient_quota)"""
+    if getattr(error, "code", None) == "insufficient_quota":
+        return False
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+def retry_after_seconds(error: Exception):
+    """Czas z nagłówka retry-after-ms / Retry-After (sekundy albo data HTTP); None, gdy brak"""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def without_sdk_retries(client):
+    """Ponowienia wykonuje bramka - wbudowane ponowienia klienta OpenAI mnożyłyby liczbę prób"""
+    with_options = getattr(client, "with_options", None)
+    if with_options is None or getattr(client, "max_retries", None) == 0:
+        return client
+    return with_options(max_retries=0)
+
+
+class LLMGateway:
+    """
+    Wszystkie zapytania procesu przechodzą przez wspólne limity RPM i TPM. Po 429 wstrzymywane są
+    także pozostałe zapytania (limit dotyczy całego klucza), a identyczne zapytania w locie
+    (bez stream=True) czekają na wynik pierwszego zamiast wysyłać własne.
+    """
+
+    def __init__(self, rpm: int = LLM_RPM, tpm: int = LLM_TPM, max_retries: int = LLM_MAX_RETRIES,
+                 backoff_base: float = LLM_BACKOFF_BASE, backoff_max: float = LLM_BACKOFF_MAX):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = {"requests": 0, "retries": 0, "rate_limited": 0, "coalesced": 0, "throttled_s": 0.0}
+        self._blocked_until = 0.0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        """Czas oczekiwania przed wysłaniem zapytania (limity RPM/TPM i wstrzymanie po 429)"""
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(tokens))
+        with self._lock:
+            blocked = self._blocked_until - time.monotonic()
+            if blocked > 0:
+                # Rozrzut, żeby wstrzymane zapytania nie wróciły wszystkie w tej samej chwili
+                delay = max(delay, blocked + random.uniform(0, self.backoff_base))
+            self.stats["requests"] += 1
+            self.stats["throttled_s"] += delay
+        return delay
+
+    def _retry_delay(self, error: Exception, attempt: int, tokens: int):
+        """Czas do ponowienia albo None, gdy błędu nie warto ponawiać lub skończyły się próby"""
+        if self.tokens is not None:
+            # Nieudana próba nie zużywa limitu tokenów
+            self.tokens.adjust(tokens)
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.backoff_base)
+        else:
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+        with self._lock:
+            self.stats["retries"] += 1
+            if getattr(error, "status_code", None) == 429:
+                self.stats["rate_limited"] += 1
+                self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        return delay
+
+    def _settle(self, tokens: int, response):
+        usage = getattr(response, "usage", None)
+        if self.tokens is not None and usage is not None:
+            self.tokens.adjust(tokens - usage.total_tokens)
+
+    def _join(self, key: str):
+        """(Future, czy to pierwsze takie zapytanie) - kolejne identyczne zapytania dostają Future pierwszego"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _finish(self, key: str, future: Future, result=None, error: BaseException = None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is None:
+            future.set_result(result)
+        elif isinstance(error, (asyncio.CancelledError, KeyboardInterrupt)):
+            future.cancel()
+        else:
+            future.set_exception(error)
+
+    def _send(self, client, kwargs: dict):
+        tokens = request_tokens(kwargs)
+        completions = without_sdk_retries(client).chat.completions
+        attempt = 0
+        while True:
+            delay = self._reserve(tokens)
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                response = completions.create(**kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, tokens)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self._settle(tokens, response)
+            return response, attempt
+
+    async def _asend(self, async_client, kwargs: dict):
+        tokens = request_tokens(kwargs)
+        completions = without_sdk_retries(async_client).chat.completions
+        attempt = 0
+        while True:
+            delay = self._reserve(tokens)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                response = await completions.create(**kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, tokens)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            self._settle(tokens, response)
+            return response, attempt
+
+    def create(self, client, **kwargs):
+        """
+        chat.completions.create z limitami i ponowieniami.
+        Zwraca (odpowiedź, liczba ponowień, czy wynik pochodzi z identycznego zapytania w locie).
+        """
+        if kwargs.get("stream"):
+            return (*self._send(client, kwargs), False)
+
+        key = request_key(client, kwargs)
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                response, _ = future.result()
+            except CancelledError:
+                # Pierwsze zapytanie zostało przerwane - zapytanie wysyłane jest ponownie (albo dołącza do nowego)
+                continue
+            return response, 0, True
+        try:
+            result = self._send(client, kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return (*result, False)
+
+    async def acreate(self, async_client, **kwargs):
+        """Odpowiednik create() dla AsyncOpenAI (łączenie zapytań działa także między wątkami i pętlami zdarzeń)"""
+        if kwargs.get("stream"):
+            return (*await self._asend(async_client, kwargs), False)
+
+        key = request_key(async_client, kwargs)
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            try:
+                response, _ = await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                # Przerwane zostało pierwsze zapytanie, a nie to oczekujące - wysyłane jest ponownie
+                if future.cancelled():
+                    continue
+                raise
+            return response, 0, True
+        try:
+            result = await self._asend(async_client, kwargs)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return (*result, False)
+
+
+_llm_gateway = None
+_llm_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Zwraca bramkę współdzieloną przez wszystkie sesje procesu"""
+    global _llm_gateway
+    with _llm_gateway_lock:
+        if _llm_gateway is None:
+            _llm_gateway = LLMGateway()
+        return _llm_gateway
@@ -0,0 +1,132 @@
+# LOTTIE ASSETS - animacje wczytywane dopiero na stronie, która ich używa, w wersji zmniejszonej lub statycznej
+import json
+import os
+import threading
+
+LOTTIE_DIR = "images"
+# Wariant animacji: minified (domyślny), original albo static (jedna klatka, bez ruchu)
+LOTTIE_VARIANT = os.getenv("ZAPLANUJ_LOTTIE_VARIANT", "minified")
+LOTTIE_REDUCED_MOTION = os.getenv("ZAPLANUJ_REDUCED_MOTION", "off").lower() in ("1", "on", "true", "yes")
+# Miejsca po przecinku we współrzędnych i klatkach kluczowych wersji zmniejszonej
+LOTTIE_PRECISION = 2
+# Łączny rozmiar animacji jednej strony - kolejne animacje ponad limit nie są wysyłane do przeglądarki
+PAGE_ASSET_BUDGET_KB = int(os.getenv("ZAPLANUJ_PAGE_ASSET_BUDGET_KB", "300"))
+
+VARIANTS = ("original", "minified", "static")
+# Metadane edytora, nieużywane przez odtwarzacz
+STRIPPED_KEYS = ("meta", "markers", "props", "mn")
+# Wartości domyślne odtwarzacza - pola z taką wartością można pominąć
+DEFAULT_VALUES = {"hd": False, "hasMask": False, "bm": 0, "ddd": 0, "ao": 0}
+
+
+def _has_expressions(node) -> bool:
+    """Czy animacja zawiera wyrażenia (klucz "x") - te odwołują się do nazw warstw i indeksów właściwości"""
+    if isinstance(node, dict):
+        return "x" in node and isinstance(node["x"], str) or any(_has_expressions(value) for value in node.values())
+    if isinstance(node, list):
+        return any(_has_expressions(value) for value in node)
+    return False
+
+
+def _is_default(key: str, value) -> bool:
+    default = DEFAULT_VALUES.get(key)
+    # Porównanie z typem - False i 0 to różne wartości domyślne
+    return default is not None and type(value) is type(default) and value == default
+
+
+def minify_lottie(data: dict, precision: int = LOTTIE_PRECISION) -> dict:
+    """
+    Kopia animacji bez metadanych edytora i pól o wartościach domyślnych, z liczbami zaokrąglonymi do precision miejsc.
+    Nazwy warstw ("nm") i indeksy właściwości ("ix") usuwane są tylko, gdy animacja nie ma wyrażeń.
+    """
+    stripped = set(STRIPPED_KEYS)
+    if not _has_expressions(data):
+        stripped.update(("nm", "ix", "cl", "ln"))
+
+    def walk(node):
+        if isinstance(node, dict):
+            return {key: walk(value) for key, value in node.items() if key not in stripped and not _is_default(key, value)}
+        if isinstance(node, list):
+            return [walk(value) for value in node]
+        if isinstance(node, float):
+            value = round(node, precision)
+            return int(value) if value.is_integer() else value
+        return node
+
+    # Obrazy osadzone w assets (p, u) i identyfikatory (id, refId) nie są liczbami, więc zostają bez zmian
+    return walk(data)
+
+
+def static_lottie(data: dict, loop: bool = True) -> dict:
+    """
+    Wariant bez ruchu: oś czasu zawężona do jednej klatki - końcowej dla animacji jednorazowych,
+    środkowej dla zapętlonych (pierwsza klatka bywa pusta, np. przed pojawieniem się elementów).
+    """
+    start, end = float(data.get("ip", 0)), float(data.get("op", 1))
+    frame = (start + end) / 2 if loop else max(start, end - 1)
+    return {**data, "ip": frame, "op": frame + 1}
+
+
+def payload_bytes(data: dict) -> int:
+    """Rozmiar animacji przesyłanej do przeglądarki (zwarty JSON)"""
+    return len(json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+
+class LottieAssets:
+    """
+    Cache animacji wspólny dla procesu: plik parsowany jest raz, a ponownie dopiero po zmianie
+    (mtime lub rozmiar). Warianty liczone są z wczytanego oryginału i trzymane razem z nim.
+    """
+
+    def __init__(self, directory: str = LOTTIE_DIR):
+        self.directory = directory
+        self.loads = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name if name.endswith(".json") else f"{name}.json")
+
+    def get(self, name: str, variant: str = LOTTIE_VARIANT, loop: bool = True) -> dict:
+        if variant not in VARIANTS:
+            raise ValueError(f"Nieznany wariant animacji: {variant}")
+
+        path = self.path(name)
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        key = (variant, loop) if variant == "static" else variant
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry["version"] != version:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = self._entries[path] = {"version": version, "variants": {"original": json.load(f)}}
+                self.loads += 1
+
+            variants = entry["variants"]
+            if variant != "original" and "minified" not in variants:
+                variants["minified"] = minify_lottie(variants["original"])
+            if key not in variants:
+                variants[key] = static_lottie(variants["minified"], loop=loop)
+            return variants[key]
+
+    def size(self, name: str, variant: str = LOTTIE_VARIANT, loop: bool = True) -> int:
+        """Rozmiar wariantu w bajtach (liczony raz na wersję pliku)"""
+        data = self.get(name, variant, loop)
+        with self._lock:
+            entry = self._entries[self.path(name)]
+            key = ("size", variant, loop)
+            if key not in entry["variants"]:
+                entry["variants"][key] = payload_bytes(data)
+            return entry["variants"][key]
+
+
+_lottie_assets = None
+_lottie_assets_lock = threading.Lock()
+
+
+def get_lottie_assets() -> LottieAssets:
+    global _lottie_assets
+    with _lottie_assets_lock:
+        if _lottie_assets is None:
+            _lottie_assets = LottieAssets()
+        return _lottie_assets
@@ -0,0 +1,246 @@
+# METRICS - czasy, tokeny, ponowienia i trafienia w cache dla etapów aplikacji (LLM, klastrowanie, PDF)
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+# Plik JSONL dopisywany na bieżąco (puste - wyłączone) i port serwera /metrics w formacie Prometheus (0 - wyłączony)
+METRICS_LOG_PATH = os.getenv("ZAPLANUJ_METRICS_LOG", "")
+METRICS_PORT = int(os.getenv("ZAPLANUJ_METRICS_PORT", "0"))
+METRICS_MAX_EVENTS = 5000
+# Do percentyli trzymane są ostatnie czasy każdego etapu
+LATENCY_WINDOW = 1000
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Cennik gpt-4o-mini w USD za 1M tokenów
+PRICE_PROMPT_PER_M = float(os.getenv("ZAPLANUJ_PRICE_PROMPT_PER_M", "0.15"))
+PRICE_COMPLETION_PER_M = float(os.getenv("ZAPLANUJ_PRICE_COMPLETION_PER_M", "0.60"))
+
+COUNTERS = ("calls", "errors", "cache_hits", "coalesced", "retries", "prompt_tokens", "completion_tokens")
+
+
+class Metrics:
+    """Pomiary wspólne dla wszystkich sesji procesu: ostatnie zdarzenia i sumy per etap"""
+
+    def __init__(self, log_path: str = METRICS_LOG_PATH, max_events: int = METRICS_MAX_EVENTS):
+        self.log_path = log_path
+        self.events = deque(maxlen=max_events)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, error: bool = False, cache_hit: bool = False, coalesced: bool = False, retries: int = 0,
+               prompt_tokens: int = 0, completion_tokens: int = 0, **labels):
+        event = {
+            "ts": round(time.time(), 3),
+            "stage": stage,
+            "seconds": round(seconds, 6),
+            "error": bool(error),
+            "cache_hit": bool(cache_hit),
+            "coalesced": bool(coalesced),
+            "retries": int(retries),
+            "prompt_tokens": int(prompt_tokens or 0),
+            "completion_tokens": int(completion_tokens or 0),
+            **labels
+        }
+
+        with self._lock:
+            self.events.append(event)
+            totals = self._stages.setdefault(stage, {
+                **{counter: 0 for counter in COUNTERS},
+                "seconds": 0.0,
+                "buckets": [0] * len(LATENCY_BUCKETS),
+                "recent": deque(maxlen=LATENCY_WINDOW)
+            })
+            totals["calls"] += 1
+            totals["errors"] += event["error"]
+            totals["cache_hits"] += event["cache_hit"]
+            totals["coalesced"] += event["coalesced"]
+            for counter in ("retries", "prompt_tokens", "completion_tokens"):
+                totals[counter] += event[counter]
+            totals["seconds"] += seconds
+            totals["recent"].append(seconds)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    totals["buckets"][i] += 1
+
+            if self.log_path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    @contextmanager
+    def measure(self, stage: str, **labels):
+        """
+        Mierzy czas bloku i zapisuje zdarzenie (również po wyjątku - z error=True).
+        Blok może uzupełnić zwrócony słownik o prompt_tokens, completion_tokens, cache_hit, coalesced i retries.
+        """
+        event = {}
+        started = time.perf_counter()
+        try:
+            yield event
+        except Exception:
+            event["error"] = True
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - started, **{**labels, **event})
+
+    def summary(self) -> list:
+        """Wiersz na etap: liczba wywołań, błędy, cache, ponowienia, tokeny, koszt i czasy (średni, p50, p95)"""
+        with self._lock:
+            stages = {stage: {**totals, "recent": list(totals["recent"])} for stage, totals in self._stages.items()}
+
+        rows = []
+        for stage, totals in sorted(stages.items()):
+            recent = np.array(totals["recent"]) if totals["recent"] else np.zeros(1)
+            rows.append({
+                "stage": stage,
+                **{counter: totals[counter] for counter in COUNTERS},
+                "cost_usd": round(
+                    totals["prompt_tokens"] * PRICE_PROMPT_PER_M / 1e6 + totals["completion_tokens"] * PRICE_COMPLETION_PER_M / 1e6, 6
+                ),
+                "total_s": round(totals["seconds"], 3),
+                "avg_s": round(totals["seconds"] / totals["calls"], 3),
+                "p50_s": round(float(np.percentile(recent, 50)), 3),
+                "p95_s": round(float(np.percentile(recent, 95)), 3)
+            })
+        return rows
+
+    def to_jsonl(self) -> str:
+        with self._lock:
+            events = list(self.events)
+        return "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events)
+
+    def to_prometheus(self) -> str:
+        """Sumy w formacie tekstowym Prometheus (liczniki i histogram czasów per etap)"""
+        with self._lock:
+            stages = {stage: dict(totals) for stage, totals in self._stages.items()}
+
+        lines = []
+        for counter in COUNTERS:
+            name = f"zaplanuj_{counter}_total"
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(f'{name}{{stage="{stage}"}} {totals[counter]}' for stage, totals in sorted(stages.items()))
+
+        lines.append("# TYPE zaplanuj_stage_seconds histogram")
+        for stage, totals in sorted(stages.items()):
+            for bound, count in zip(LATENCY_BUCKETS, totals["buckets"]):
+                lines.append(f'zaplanuj_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'zaplanuj_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {totals["calls"]}')
+            lines.append(f'zaplanuj_stage_seconds_sum{{stage="{stage}"}} {totals["seconds"]:.6f}')
+            lines.append(f'zaplanuj_stage_seconds_count{{stage="{stage}"}} {totals["calls"]}')
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.events.clear()
+            self._stages.clear()
+
+
+def start_metrics_server(metrics: Metrics, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serwer HTTP z /metrics (Prometheus) i /metrics.jsonl w wątku w tle"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/metrics":
+                body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4"
+            elif self.path.rstrip("/") == "/metrics.jsonl":
+                body, content_type = metrics.to_jsonl(), "application/x-ndjson"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ---MEMORY---
+def _array_key(values: np.ndarray):
+    """Adres i rozmiar bufora - kolumny współdzielone przez kilka ramek liczone są raz"""
+    return values.__array_interface__["data"][0], values.nbytes
+
+
+def object_buffers(obj) -> dict:
+    """
+    Bufory danych obiektu {klucz bufora: bajty}: kolumny DataFrame (kody kategorii, tablice liczb, napisy),
+    tablice numpy (bez plików mapowanych w pamięć), macierz cech eksperymentu oraz zawartość słowników i list.
+    """
+    buffers = {}
+    if isinstance(obj, pd.DataFrame):
+        for i in range(obj.shape[1]):
+            column = obj.iloc[:, i]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                codes = column.cat.codes.to_numpy()
+                buffers[_array_key(codes)] = codes.nbytes + int(column.cat.categories.memory_usage(deep=True))
+            else:
+                values = column.to_numpy()
+                buffers[_array_key(values)] = int(column.memory_usage(index=False, deep=True))
+        buffers[("index", id(obj.index))] = int(obj.index.memory_usage(deep=True))
+    elif isinstance(obj, np.memmap):
+        pass
+    elif isinstance(obj, np.ndarray):
+        buffers[_array_key(obj)] = obj.nbytes
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            buffers.update(object_buffers(value))
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            buffers.update(object_buffers(value))
+    elif hasattr(obj, "get_config"):
+        try:
+            buffers.update(object_buffers(np.asarray(obj.get_config("X_train_transformed"))))
+        except KeyError:
+            pass
+    return buffers
+
+
+def memory_report(objects: dict) -> list:
+    """
+    Pamięć obiektów {nazwa: obiekt} w MB: łącznie oraz "własna" - bez buforów policzonych już
+    przy wcześniejszych obiektach (np. kolumn współdzielonych przez dane i dane z grupami).
+    """
+    seen, rows = set(), []
+    for name, obj in objects.items():
+        buffers = object_buffers(obj)
+        own = {key: size for key, size in buffers.items() if key not in seen}
+        seen.update(buffers)
+        rows.append({
+            "object": name,
+            "total_mb": round(sum(buffers.values()) / 1024 / 1024, 2),
+            "own_mb": round(sum(own.values()) / 1024 / 1024, 2)
+        })
+    return rows
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """Wspólny obiekt metryk procesu (przy ZAPLANUJ_METRICS_PORT uruchamia też serwer /metrics)"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+            if METRICS_PORT:
+                try:
+                    start_metrics_server(_metrics, METRICS_PORT)
+                except OSError:
+                    # Port zajęty (np. drugi proces aplikacji) - metryki nadal dostępne w panelu administratora
+                    pass
+        return _metrics
@@ -0,0 +1,87 @@
+# OPENAI POOL - klienci OpenAI współdzieleni przez sesje i reruny (jeden na klucz API) i cache weryfikacji kluczy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import openai
+
+OPENAI_POOL_SIZE = 32
+# Jak długo (w sekundach) pamiętany jest wynik sprawdzenia klucza API
+API_KEY_VERIFY_TTL = float(os.getenv("ZAPLANUJ_API_KEY_TTL", "300"))
+API_KEY_VERIFY_TIMEOUT = 10
+
+
+def api_key_hash(api_key: str) -> str:
+    """W puli i cache trzymany jest skrót klucza, nie sam klucz"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+class OpenAIClientPool:
+    """
+    Jeden klient OpenAI na klucz API (LRU do max_clients) - kolejne reruny i sesje z tym samym kluczem
+    korzystają z tej samej puli połączeń HTTP. Ponowienia wykonuje bramka LLM, więc klienci mają max_retries=0.
+    """
+
+    def __init__(self, max_clients: int = OPENAI_POOL_SIZE, verify_ttl: float = API_KEY_VERIFY_TTL):
+        self.max_clients = max_clients
+        self.verify_ttl = verify_ttl
+        self._clients = OrderedDict()
+        self._verified = {}
+        self._lock = threading.Lock()
+
+    def get(self, api_key: str) -> openai.OpenAI:
+        key = api_key_hash(api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+
+            client = self._clients[key] = openai.OpenAI(api_key=api_key, max_retries=0)
+            # Usunięty klient nie jest zamykany - sesja może jeszcze z niego korzystać
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+            return client
+
+    def verify(self, api_key: str, model: str) -> bool:
+        """
+        Sprawdza klucz jednym lekkim zapytaniem (models.retrieve). Wynik jest pamiętany przez verify_ttl sekund;
+        błąd sieci nie jest zapamiętywany, żeby chwilowa awaria nie blokowała logowania.
+        """
+        key = api_key_hash(api_key)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._verified.get(key)
+            if cached is not None and cached[1] > now:
+                return cached[0]
+
+        try:
+            # Klient jednorazowy - do puli trafia dopiero poprawny klucz, więc nieudane logowania nie wypierają z niej klientów
+            with openai.OpenAI(api_key=api_key, max_retries=0) as client:
+                client.models.retrieve(model, timeout=API_KEY_VERIFY_TIMEOUT)
+            valid = True
+        except (openai.AuthenticationError, openai.PermissionDeniedError):
+            valid = False
+        except Exception:
+            return False
+
+        with self._lock:
+            self._verified = {k: v for k, v in self._verified.items() if v[1] > now}
+            self._verified[key] = (valid, now + self.verify_ttl)
+        if valid:
+            self.get(api_key)
+        return valid
+
+
+_openai_pool = None
+_openai_pool_lock = threading.Lock()
+
+
+def get_openai_pool() -> OpenAIClientPool:
+    global _openai_pool
+    with _openai_pool_lock:
+        if _openai_pool is None:
+            _openai_pool = OpenAIClientPool()
+        return _openai_pool
@@ -0,0 +1,284 @@
+# PDF EXPORT - eksport kampanii reklamowych do PDF (reportlab)
+import os
+import platform
+import re
+import zipfile
+from functools import lru_cache
+from io import BytesIO, TextIOWrapper
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN_LEFT = 2 * cm
+MARGIN_TOP = PAGE_HEIGHT - 2 * cm
+LINE_HEIGHT = 16
+
+FONT_CANDIDATES = {
+    "Windows": [
+        ("C:/Windows/Fonts/arial.ttf", "C:/Windows/Fonts/arialbd.ttf"),
+        ("C:/Windows/Fonts/calibri.ttf", "C:/Windows/Fonts/calibrib.ttf"),
+        ("C:/Windows/Fonts/tahoma.ttf", "C:/Windows/Fonts/tahomabd.ttf")
+    ],
+    "Darwin": [
+        ("/System/Library/Fonts/Arial.ttf", "/System/Library/Fonts/Arial Bold.ttf"),
+    ],
+    "Linux": [
+        ("/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+         "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf"),
+        ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+         "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf")
+    ]
+}
+
+POLISH_REPLACEMENTS = str.maketrans({
+    'ą': 'a', 'ć': 'c', 'ę': 'e', 'ł': 'l', 'ń': 'n', 'ó': 'o', 'ś': 's', 'ź': 'z', 'ż': 'z',
+    'Ą': 'A', 'Ć': 'C', 'Ę': 'E', 'Ł': 'L', 'Ń': 'N', 'Ó': 'O', 'Ś': 'S', 'Ź': 'Z', 'Ż': 'Z'
+})
+
+
+@lru_cache(maxsize=None)
+def register_fonts():
+    """
+    Rejestruje fonty z obsługą polskich znaków - raz na proces.
+    Zwraca (font, font pogrubiony); gdy brak fontów systemowych - Helvetica.
+    """
+    font_paths = FONT_CANDIDATES.get(platform.system(), FONT_CANDIDATES["Linux"])
+
+    for regular_path, bold_path in font_paths:
+        if not os.path.exists(regular_path):
+            continue
+        try:
+            pdfmetrics.registerFont(TTFont('CustomFont', regular_path))
+            if os.path.exists(bold_path):
+                pdfmetrics.registerFont(TTFont('CustomFont-Bold', bold_path))
+                return 'CustomFont', 'CustomFont-Bold'
+            return 'CustomFont', 'CustomFont'
+        except Exception:
+            continue
+    return 'Helvetica', 'Helvetica-Bold'
+
+
+def clean_text(text: str) -> str:
+    """Zamień polskie znaki na bezpieczne w razie problemów"""
+    return text.translate(POLISH_REPLACEMENTS)
+
+
+def parse_markdown_line(line: str, font_name: str, font_bold: str) -> dict:
+    """Parsuje pojedynczą linię Markdown i zwraca informacje o formatowaniu"""
+    # Nagłówki
+    if line.startswith('####'):
+        return {'text': line[4:].strip(), 'type': 'header4', 'font': font_bold, 'size': 12}
+    elif line.startswith('###'):
+        return {'text': line[3:].strip(), 'type': 'header3', 'font': font_bold, 'size': 14}
+    elif line.startswith('##'):
+        return {'text': line[2:].strip(), 'type': 'header2', 'font': font_bold, 'size': 16}
+    elif line.startswith('#'):
+        return {'text': line[1:].strip(), 'type': 'header1', 'font': font_bold, 'size': 18}
+
+    # Listy numerowane
+    elif re.match(r'^\d+\.', line.strip()):
+        text = re.sub(r'^\d+\.\s*', '', line.strip())
+        return {'text': f"• {text}", 'type': 'list', 'font': font_name, 'size': 11}
+
+    # Listy punktowane
+    elif line.strip().startswith('-') or line.strip().startswith('*'):
+        text = line.strip()[1:].strip()
+        return {'text': f"• {text}", 'type': 'list', 'font': font_name, 'size': 11}
+
+    # Tekst pogrubiony **text**
+    elif '**' in line:
+        text = re.sub(r'\*\*(.*?)\*\*', r'\1', line)
+        return {'text': text, 'type': 'bold', 'font': font_bold, 'size': 11}
+
+    # Zwykły tekst
+    else:
+        return {'text': line, 'type': 'normal', 'font': font_name, 'size': 11}
+
+
+def draw_text_safely(c, x, y, text, font, size) -> bool:
+    """Rysuje tekst z obsługą błędów kodowania"""
+    try:
+        c.setFont(font, size)
+        c.drawString(x, y, text)
+        return True
+    except Exception:
+        try:
+            c.setFont('Helvetica-Bold' if 'Bold' in font else 'Helvetica', size)
+            c.drawString(x, y, clean_text(text))
+            return True
+        except Exception:
+            return False
+
+
+@lru_cache(maxsize=16384)
+def word_width(word: str, font: str, size: float) -> float:
+    """Szerokość pojedynczego słowa (cache współdzielony między dokumentami)"""
+    try:
+        return stringWidth(word, font, size)
+    except Exception:
+        return len(word) * (size * 0.6)  # Przybliżone
+
+
+def wrap_text(text: str, font: str, size: float, max_width: float) -> list:
+    """
+    Łamie tekst na linie dopasowane do szerokości.
+    Szerokość linii to suma szerokości słów i spacji, więc koszt jest liniowy względem długości tekstu.
+    """
+    space_width = word_width(" ", font, size)
+    lines = []
+    current_words = []
+    current_width = 0.0
+
+    for word in text.split():
+        width = word_width(word, font, size)
+        test_width = current_width + space_width + width if current_words else width
+
+        if test_width <= max_width:
+            current_words.append(word)
+            current_width = test_width
+        else:
+            if current_words:
+                lines.append(" ".join(current_words))
+            current_words = [word]
+            current_width = width
+
+    if current_words:
+        lines.append(" ".join(current_words))
+
+    return lines
+
+
+def draw_campaign(c, title: str, content: str):
+    """Rysuje kampanię na kanwie, zaczynając od bieżącej (pustej) strony"""
+    font_name, font_bold = register_fonts()
+
+    # Tytuł dokumentu
+    try:
+        c.setFont(font_bold, 20)
+        c.drawString(MARGIN_LEFT, MARGIN_TOP, title)
+    except Exception:
+        c.setFont('Helvetica-Bold', 20)
+        c.drawString(MARGIN_LEFT, MARGIN_TOP, clean_text(title))
+
+    y = MARGIN_TOP - 40
+    max_width = PAGE_WIDTH - 2 * MARGIN_LEFT
+
+    # Przetwarzanie treści
+    for line in content.split('\n'):
+        line = line.strip()
+
+        if not line:  # Pusta linia
+            y -= LINE_HEIGHT * 0.5
+            continue
+
+        parsed = parse_markdown_line(line, font_name, font_bold)
+
+        # Sprawdź czy trzeba przejść na nową stronę
+        if y < 3 * cm:
+            c.showPage()
+            y = PAGE_HEIGHT - 2 * cm
+
+        # Dodatkowy odstęp przed nagłówkami
+        if parsed['type'].startswith('header'):
+            y -= 5
+
+        # Zawijanie tekstu dla długich linii
+        for wrapped_line in wrap_text(parsed['text'], parsed['font'], parsed['size'], max_width):
+            if y < 2 * cm:
+                c.showPage()
+                y = PAGE_HEIGHT - 2 * cm
+
+            # Wcięcie dla list
+            x_pos = MARGIN_LEFT + (15 if parsed['type'] == 'list' else 0)
+
+            draw_text_safely(c, x_pos, y, wrapped_line, parsed['font'], parsed['size'])
+            y -= LINE_HEIGHT
+
+        # Dodatkowy odstęp po nagłówkach
+        if parsed['type'].startswith('header'):
+            y -= 5
+
+
+def export_campaign_to_pdf(title: str, content: str) -> BytesIO:
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    draw_campaign(c, title, content)
+    c.save()
+    buffer.seek(0)
+    return buffer
+
+
+def draw_table_of_contents(c, entries: list):
+    """Rysuje spis treści - każda pozycja to link do zakładki (entries: [(tytuł, klucz zakładki)])"""
+    font_name, font_bold = register_fonts()
+    draw_text_safely(c, MARGIN_LEFT, MARGIN_TOP, "Spis treści", font_bold, 20)
+
+    y = MARGIN_TOP - 40
+    for nr, (title, bookmark) in enumerate(entries, start=1):
+        if y < 2 * cm:
+            c.showPage()
+            y = PAGE_HEIGHT - 2 * cm
+
+        text = f"{nr}. {title}"
+        draw_text_safely(c, MARGIN_LEFT, y, text, font_name, 12)
+        text_width = word_width(text, font_name, 12)
+        c.linkAbsolute(text, bookmark, Rect=(MARGIN_LEFT, y - 3, MARGIN_LEFT + text_width, y + 12))
+        y -= LINE_HEIGHT + 4
+
+
+def export_campaigns_to_pdf(campaigns: list) -> BytesIO:
+    """
+    Jeden PDF ze wszystkimi kampaniami (campaigns: [(tytuł, treść)]), renderowany w jednym przebiegu
+    na wspólnej kanwie: spis treści z linkami, a każda kampania od nowej strony z zakładką w konspekcie.
+    """
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    bookmarks = [f"campaign_{nr}" for nr in range(len(campaigns))]
+
+    draw_table_of_contents(c, [(title, bookmark) for (title, _), bookmark in zip(campaigns, bookmarks)])
+    c.showPage()
+
+    for (title, content), bookmark in zip(campaigns, bookmarks):
+        c.bookmarkPage(bookmark)
+        c.addOutlineEntry(title, bookmark, level=0)
+        draw_campaign(c, title, content)
+        c.showPage()
+
+    c.save()
+    buffer.seek(0)
+    return buffer
+
+
+def safe_file_name(name: str) -> str:
+    return re.sub(r'[^\w\-. ]', '_', name).strip() or "kampania"
+
+
+def write_campaigns_zip(target, campaigns: list, clustered_df=None, render_pdf=None):
+    """
+    Zapisuje ZIP z PDF-em każdej kampanii (campaigns: [(tytuł, treść, nazwa pliku)]) i opcjonalnie CSV z danymi.
+    Wpisy zapisywane są strumieniowo do target (ścieżka lub plik binarny) - archiwum nie powstaje w pamięci.
+    """
+    render_pdf = render_pdf or (lambda title, content: export_campaign_to_pdf(title, content).getvalue())
+
+    with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        used_names = set()
+        for title, content, file_name in campaigns:
+            stem, _, extension = safe_file_name(file_name).rpartition(".")
+            entry_name, suffix = f"{stem}.{extension}", 1
+            while entry_name in used_names:
+                suffix += 1
+                entry_name = f"{stem}_{suffix}.{extension}"
+            used_names.add(entry_name)
+
+            with archive.open(entry_name, "w") as entry:
+                entry.write(render_pdf(title, content))
+
+        if clustered_df is not None:
+            with archive.open("dane_z_grupami.csv", "w", force_zip64=True) as entry:
+                with TextIOWrapper(entry, encoding="utf-8", newline="") as text_entry:
+                    clustered_df.to_csv(text_entry, index=False)
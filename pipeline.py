@@ -0,0 +1,251 @@
+# PIPELINE - przetwarzanie wsadowe bez interfejsu: CSV -> grupy -> opisy -> kampanie -> PDF
+#
+# Użycie:
+#   python pipeline.py dane/*.csv --output wyniki --groups 4 --goal "zwiększenie sprzedaży"
+#
+# Klastrowanie plików odbywa się w osobnych procesach, a zapytania do OpenAI wysyłane są asynchronicznie,
+# więc opisy i kampanie jednego pliku powstają w czasie, gdy kolejne pliki są jeszcze klastrowane.
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+from clustering import CLUSTERING_ENGINE, GROUP_COLUMN, SAMPLE_SIZE, fit_clustering
+from ingestion import read_csv_budgeted
+from llm import LLM_MAX_WORKERS, agenerate_campaign, agenerate_group_descriptions
+from llm_gateway import without_sdk_retries
+from metrics import get_metrics
+from pdf_export import export_campaigns_to_pdf, safe_file_name
+from profiling import PROFILE_TOKEN_BUDGET, profile_groups
+
+PIPELINE_PROCESSES = int(os.getenv("ZAPLANUJ_PIPELINE_PROCESSES", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+REPORT_FILE = "raport.json"
+
+
+def segment_file(path: str, output_dir: str, num_groups: int, sample_size: int = SAMPLE_SIZE, engine: str = CLUSTERING_ENGINE,
+                 token_budget: int = PROFILE_TOKEN_BUDGET) -> dict:
+    """
+    Etap procesowy: wczytanie CSV, klastrowanie, zapis danych z grupami i profile grup.
+    Zwraca tylko małe wyniki (profile, liczebności, czasy) - DataFrame nie wraca do procesu głównego.
+    """
+    timings = {}
+    started = time.perf_counter()
+    with open(path, "rb") as source:
+        df, ingest_report = read_csv_budgeted(source, size_bytes=os.path.getsize(path))
+    timings["ingestion"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    _, _, clustered_df = fit_clustering(
+        df,
+        num_groups,
+        sample_size=sample_size if sample_size and len(df) > sample_size else None,
+        engine=engine
+    )
+    timings["clustering"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    profiles, profile_report = profile_groups(clustered_df, token_budget=token_budget)
+    timings["profiling"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    clustered_df.to_csv(os.path.join(output_dir, "dane_z_grupami.csv"), index=False)
+    timings["assignments"] = time.perf_counter() - started
+
+    return {
+        "rows": ingest_report["rows"],
+        "columns": ingest_report["columns"],
+        "truncated": ingest_report["truncated"],
+        "group_sizes": {str(group): int(size) for group, size in clustered_df[GROUP_COLUMN].value_counts().sort_index().items()},
+        "profiles": profiles,
+        "tokens_saved": profile_report["tokens_saved"],
+        "timings": timings
+    }
+
+
+def limit_concurrency(async_client, max_requests: int):
+    """
+    Klient z limitem jednoczesnych zapytań chat.completions.create (wspólnym dla wszystkich plików).
+    Limity RPM/TPM i ponowienia zapewnia bramka LLM, więc wbudowane ponowienia klienta są wyłączone.
+    """
+    semaphore = asyncio.Semaphore(max_requests)
+    async_client = without_sdk_retries(async_client)
+
+    async def create(**kwargs):
+        async with semaphore:
+            return await async_client.chat.completions.create(**kwargs)
+
+    # Adres i klucz API klienta - bramka LLM łączy tylko identyczne zapytania wysyłane tym samym kluczem
+    return SimpleNamespace(
+        api_key=getattr(async_client, "api_key", None),
+        base_url=getattr(async_client, "base_url", ""),
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+
+
+async def generate_texts(async_client, segmentation: dict, campaign_goal: str, output_dir: str, batch: bool = True, pdf: bool = True) -> dict:
+    """Etap asynchroniczny: opisy grup, kampanie (współbieżnie), zapis JSON i zbiorczego PDF"""
+    timings = {}
+    profiles = segmentation["profiles"]
+
+    started = time.perf_counter()
+    descriptions = await agenerate_group_descriptions(async_client, profiles, batch=batch)
+    timings["descriptions"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    groups = list(profiles)
+    campaigns = await asyncio.gather(*(
+        agenerate_campaign(async_client, campaign_goal, group, *descriptions[group]) for group in groups
+    ))
+    timings["campaigns"] = time.perf_counter() - started
+
+    texts = {
+        group: {"name": descriptions[group][0], "description": descriptions[group][1], "campaign": campaign}
+        for group, campaign in zip(groups, campaigns)
+    }
+    with open(os.path.join(output_dir, "grupy.json"), "w", encoding="utf-8") as f:
+        json.dump(texts, f, ensure_ascii=False, indent=2)
+
+    if pdf:
+        started = time.perf_counter()
+        pdf_campaigns = [(f"Kampania reklamowa - {text['name']}", text["campaign"]) for text in texts.values()]
+        # Renderowanie PDF obciąża CPU - w wątku, żeby nie blokować pętli zdarzeń innych plików
+        buffer = await asyncio.to_thread(export_campaigns_to_pdf, pdf_campaigns)
+        with open(os.path.join(output_dir, "kampanie.pdf"), "wb") as f:
+            f.write(buffer.getvalue())
+        timings["pdf"] = time.perf_counter() - started
+
+    return {"timings": timings}
+
+
+def output_dirs(paths: list, output_root: str) -> dict:
+    """Katalog wyników dla każdego pliku (nazwa pliku bez rozszerzenia, z sufiksem przy powtórzeniach)"""
+    dirs, used = {}, set()
+    for path in paths:
+        stem = safe_file_name(os.path.splitext(os.path.basename(path))[0])
+        name, suffix = stem, 1
+        while name in used:
+            suffix += 1
+            name = f"{stem}_{suffix}"
+        used.add(name)
+        dirs[path] = os.path.join(output_root, name)
+    return dirs
+
+
+async def run_batch_async(paths: list, output_root: str, num_groups: int, campaign_goal: str, async_client=None,
+                          processes: int = PIPELINE_PROCESSES, max_requests: int = LLM_MAX_WORKERS, engine: str = CLUSTERING_ENGINE,
+                          sample_size: int = SAMPLE_SIZE, token_budget: int = PROFILE_TOKEN_BUDGET, batch: bool = True, pdf: bool = True) -> dict:
+    if async_client is None:
+        from openai import AsyncOpenAI
+        async_client = AsyncOpenAI()
+    client = limit_concurrency(async_client, max_requests)
+
+    started = time.perf_counter()
+    dirs = output_dirs(paths, output_root)
+    files = {path: {"path": path, "output_dir": dirs[path]} for path in paths}
+    loop = asyncio.get_running_loop()
+
+    async def process(path, executor):
+        report = files[path]
+        try:
+            segmentation = await loop.run_in_executor(
+                executor, segment_file, path, dirs[path], num_groups, sample_size, engine, token_budget
+            )
+            texts = await generate_texts(client, segmentation, campaign_goal, dirs[path], batch=batch, pdf=pdf)
+            report.update({key: value for key, value in segmentation.items() if key != "profiles"})
+            report["timings"].update(texts["timings"])
+            report["status"] = "ok"
+        except Exception as e:
+            report.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+
+    # spawn - procesy robocze nie dziedziczą wątków ani stanu pętli zdarzeń
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max(1, min(processes, len(paths))), mp_context=context) as executor:
+        await asyncio.gather(*(process(path, executor) for path in paths))
+
+    return build_report(list(files.values()), time.perf_counter() - started)
+
+
+def build_report(files: list, wall_time: float) -> dict:
+    """Raport przepustowości: czasy etapów (suma po plikach), wiersze i pliki na sekundę"""
+    ok = [report for report in files if report.get("status") == "ok"]
+    rows = sum(report["rows"] for report in ok)
+    stages = {}
+    for report in ok:
+        for stage, seconds in report["timings"].items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+    return {
+        "files": len(files),
+        "files_ok": len(ok),
+        "files_failed": len(files) - len(ok),
+        "rows": rows,
+        "wall_time_s": round(wall_time, 3),
+        "rows_per_s": round(rows / wall_time, 1) if wall_time else None,
+        "files_per_min": round(len(ok) / wall_time * 60, 2) if wall_time else None,
+        "stage_time_s": {stage: round(seconds, 3) for stage, seconds in stages.items()},
+        "llm": [row for row in get_metrics().summary() if row["stage"].startswith("llm")],
+        "details": files
+    }
+
+
+def run_batch(paths: list, output_root: str, num_groups: int, campaign_goal: str, **kwargs) -> dict:
+    """
+    Przetwarza wiele plików CSV: dla każdego zapisuje w output_root/<nazwa pliku>/ dane z grupami (CSV),
+    nazwy, opisy i kampanie (grupy.json) oraz kampanie.pdf. Raport przepustowości trafia do output_root/raport.json.
+    """
+    report = asyncio.run(run_batch_async(paths, output_root, num_groups, campaign_goal, **kwargs))
+    os.makedirs(output_root, exist_ok=True)
+    with open(os.path.join(output_root, REPORT_FILE), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Zaplanuj.to - segmentacja i kampanie dla wielu plików CSV bez interfejsu")
+    parser.add_argument("inputs", nargs="+", help="Pliki CSV z danymi klientów")
+    parser.add_argument("-o", "--output", default="wyniki", help="Katalog wyników (domyślnie: wyniki)")
+    parser.add_argument("-k", "--groups", type=int, required=True, help="Liczba grup docelowych")
+    parser.add_argument("-g", "--goal", required=True, help="Cel kampanii reklamowej")
+    parser.add_argument("--processes", type=int, default=PIPELINE_PROCESSES, help="Liczba procesów klastrowania")
+    parser.add_argument("--max-requests", type=int, default=LLM_MAX_WORKERS, help="Maks. liczba jednoczesnych zapytań do OpenAI")
+    parser.add_argument("--engine", choices=["sklearn", "pycaret"], default=CLUSTERING_ENGINE, help="Silnik klastrowania")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE, help="Próbka treningowa dla dużych plików (0 - bez próbkowania)")
+    parser.add_argument("--token-budget", type=int, default=PROFILE_TOKEN_BUDGET, help="Budżet tokenów na profil grupy")
+    parser.add_argument("--no-batch", action="store_true", help="Opisy grup generowane pojedynczo zamiast wsadowo")
+    parser.add_argument("--no-pdf", action="store_true", help="Bez zbiorczego PDF z kampaniami")
+    args = parser.parse_args(argv)
+
+    report = run_batch(
+        args.inputs,
+        args.output,
+        args.groups,
+        args.goal,
+        processes=args.processes,
+        max_requests=args.max_requests,
+        engine=args.engine,
+        sample_size=args.sample_size,
+        token_budget=args.token_budget,
+        batch=not args.no_batch,
+        pdf=not args.no_pdf
+    )
+
+    for details in report["details"]:
+        status = "✅" if details["status"] == "ok" else f"❌ {details['error']}"
+        print(f"{details['path']}: {status}")
+    print(
+        f"Pliki: {report['files_ok']}/{report['files']}, wiersze: {report['rows']}, czas: {report['wall_time_s']:.1f} s, "
+        f"{report['rows_per_s']} wierszy/s, {report['files_per_min']} plików/min"
+    )
+    print("Czas etapów (suma po plikach): " + ", ".join(f"{stage} {seconds:.2f} s" for stage, seconds in report["stage_time_s"].items()))
+    print(f"Raport: {os.path.join(args.output, REPORT_FILE)}")
+    return 0 if report["files_failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
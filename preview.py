@@ -0,0 +1,51 @@
+# PREVIEW - podgląd dużych danych stronami: do przeglądarki trafia tylko bieżąca strona wybranych kolumn
+import os
+
+import numpy as np
+import pandas as pd
+
+from clustering import GROUP_COLUMN, with_group_names
+from ingestion import PYARROW_AVAILABLE
+
+# Domyślna liczba wierszy na stronie podglądu
+PREVIEW_PAGE_SIZE = int(os.getenv("ZAPLANUJ_PREVIEW_PAGE_SIZE", "100"))
+PAGE_SIZES = tuple(sorted({50, 100, 500, 1000, PREVIEW_PAGE_SIZE}))
+
+
+def page_count(rows: int, page_size: int) -> int:
+    return max(1, -(-rows // page_size))
+
+
+def group_positions(groups: pd.Series, selected) -> np.ndarray:
+    """Pozycje wierszy należących do wybranych grup (porównanie kodów kategorii, bez napisów w każdym wierszu)"""
+    if isinstance(groups.dtype, pd.CategoricalDtype):
+        codes = [groups.cat.categories.get_loc(group) for group in selected if group in groups.cat.categories]
+        return np.flatnonzero(np.isin(groups.cat.codes.to_numpy(), codes))
+    return np.flatnonzero(groups.isin(selected).to_numpy())
+
+
+def preview_page(df: pd.DataFrame, page: int, page_size: int, columns=None, groups=None, group_names: dict = None):
+    """
+    Strona podglądu jako tabela Arrow (bez pyarrow - DataFrame): (tabela, liczba wierszy po filtrze).
+    page liczone od 1 (poza zakresem - ostatnia strona), columns zawęża kolumny, groups filtruje wiersze po grupie.
+    Przy group_names (dane z grupami) dodawana jest kolumna z nazwami grup - tylko dla wierszy strony.
+    """
+    positions = None
+    if groups:
+        positions = group_positions(df[GROUP_COLUMN], groups)
+    rows = len(df) if positions is None else len(positions)
+
+    page = min(max(1, page), page_count(rows, page_size))
+    start = (page - 1) * page_size
+    window = slice(start, start + page_size)
+    page_df = df.iloc[window] if positions is None else df.take(positions[window])
+
+    if group_names is not None:
+        page_df = with_group_names(page_df, group_names)
+    if columns:
+        page_df = page_df[[column for column in page_df.columns if column in columns]]
+    if not PYARROW_AVAILABLE:
+        return page_df, rows
+    import pyarrow as pa
+    # Indeks zostaje - numery wierszy pozwalają odnaleźć je w pełnych danych
+    return pa.Table.from_pandas(page_df, preserve_index=True), rows
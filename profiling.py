@@ -0,0 +1,189 @@
+# PROFILING - zwięzłe profile statystyczne grup docelowych do promptów
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from clustering import GROUP_COLUMN
+
+TOP_CATEGORIES = 3
+QUANTILES = [0.25, 0.5, 0.75]
+NUMERIC_MEASURES = ["mean", "std", "min", "max", "q25", "q50", "q75"]
+# Kolumna kategoryczna z co najmniej takim odsetkiem unikalnych wartości to identyfikator (np. ID, imię) -
+# udziały jej wartości w grupach różnią się od ogółu przypadkiem, więc nie opisuje grup
+IDENTIFIER_RATIO = 0.5
+# Budżet tokenów na profil jednej grupy w prompcie (szacunek offline)
+PROFILE_TOKEN_BUDGET = int(os.getenv("ZAPLANUJ_PROFILE_TOKENS", "400"))
+
+NUMERIC_HEADER = "Cechy liczbowe (średnia | mediana | odch. std | min–max | Q1–Q3 | różnica średniej od ogółu):"
+CATEGORICAL_HEADER = "Cechy kategoryczne (najczęstsze wartości):"
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Przybliżona liczba tokenów bez tokenizera sieciowego: każde słowo to ok. 1 token na 4 znaki,
+    a każdy znak interpunkcyjny to osobny token.
+    """
+    return sum((len(piece) + 3) // 4 for piece in TOKEN_PATTERN.findall(text))
+
+
+def format_number(value) -> str:
+    if value is None or pd.isna(value):
+        return "-"
+    value = float(value)
+    if abs(value) >= 100:
+        return f"{value:,.0f}".replace(",", " ")
+    if abs(value) >= 1:
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    return f"{value:.3g}"
+
+
+def group_statistics(clustered_df: pd.DataFrame, group_column: str = GROUP_COLUMN, top_categories: int = TOP_CATEGORIES) -> dict:
+    """
+    Statystyki wszystkich grup liczone wektorowo na jednym obiekcie groupby (bez filtrowania i kopii per grupa).
+    Zwraca {"sizes", "numeric", "categorical", "scores"}: liczebności, miary liczbowe
+    ({grupa: {miara: {cecha: wartość}}}), najczęstsze wartości cech kategorycznych
+    oraz tabelę grupa x cecha z tym, jak mocno cecha odróżnia grupę od ogółu.
+    """
+    features = clustered_df.drop(columns=[group_column])
+    numeric_columns = features.select_dtypes(include="number").columns.tolist()
+    categorical_columns = features.select_dtypes(include=["object", "category", "bool"]).columns.tolist()
+
+    grouped = clustered_df.groupby(group_column, observed=True, sort=True)
+    sizes = grouped.size()
+    scores = pd.DataFrame(index=sizes.index)
+
+    numeric = {}
+    if numeric_columns:
+        means = grouped[numeric_columns].mean()
+        table = {
+            "mean": means,
+            "std": grouped[numeric_columns].std(),
+            "min": grouped[numeric_columns].min(),
+            "max": grouped[numeric_columns].max()
+        }
+
+        # Kwartyle w numpy na pozycjach wierszy z tego samego groupby (groupby.quantile w pandas jest wielokrotnie wolniejsze)
+        values = features[numeric_columns].to_numpy(dtype=np.float64)
+        quantile = np.nanquantile if np.isnan(values).any() else np.quantile
+        positions = grouped.indices
+        quartiles = np.stack([quantile(values[positions[group]], QUANTILES, axis=0) for group in sizes.index], axis=1)
+        for measure, rows in zip(["q25", "q50", "q75"], quartiles):
+            table[measure] = pd.DataFrame(rows, index=sizes.index, columns=numeric_columns)
+
+        # Odległość średniej grupy od średniej ogółu w odchyleniach standardowych
+        global_std = features[numeric_columns].std().replace(0, np.nan)
+        table["z"] = (means - features[numeric_columns].mean()) / global_std
+        scores = scores.join(table["z"].abs().fillna(0))
+
+        numeric = {
+            group: {measure: frame.loc[group].to_dict() for measure, frame in table.items()}
+            for group in sizes.index
+        }
+
+    categorical = {}
+    for column in categorical_columns:
+        shares = grouped[column].value_counts(normalize=True, dropna=False)
+        categorical[column] = shares[shares > 0].groupby(level=0, observed=True, sort=False).head(top_categories)
+
+        if features[column].nunique(dropna=False) >= IDENTIFIER_RATIO * len(features) and len(features) > TOP_CATEGORIES:
+            scores[column] = 0.0
+            continue
+
+        # Suma różnic udziałów względem ogółu (2 x total variation), skala zbliżona do z-score
+        group_shares = shares.unstack(fill_value=0)
+        global_shares = features[column].value_counts(normalize=True, dropna=False).reindex(group_shares.columns, fill_value=0)
+        scores[column] = (group_shares - global_shares).abs().sum(axis=1)
+
+    return {"sizes": sizes, "numeric": numeric, "categorical": categorical, "scores": scores.fillna(0)}
+
+
+def feature_line(stats: dict, group, feature) -> str:
+    if group in stats["numeric"] and feature in stats["numeric"][group]["mean"]:
+        values = {measure: column_values[feature] for measure, column_values in stats["numeric"][group].items()}
+        return (
+            f"- {feature}: {format_number(values['mean'])} | {format_number(values['q50'])} | "
+            f"{format_number(values['std'])} | {format_number(values['min'])}–{format_number(values['max'])} | "
+            f"{format_number(values['q25'])}–{format_number(values['q75'])}"
+            + (f" | {values['z']:+.1f}σ" if pd.notna(values['z']) else "")
+        )
+
+    shares = stats["categorical"][feature]
+    top = shares.loc[group] if group in shares.index.get_level_values(0) else pd.Series(dtype=float)
+    values = ", ".join(f"{value} {share:.0%}" for value, share in top.items())
+    return f"- {feature}: {values or '-'}"
+
+
+def format_group_profile(stats: dict, group, features=None) -> str:
+    """Tekstowy profil jednej grupy; features ogranicza i porządkuje wypisane cechy (domyślnie wszystkie)"""
+    sizes = stats["sizes"]
+    features = stats["scores"].columns if features is None else features
+    numeric_columns = set(stats["numeric"][group]["mean"]) if group in stats["numeric"] else set()
+
+    lines = [f"Liczebność: {sizes[group]} ({sizes[group] / sizes.sum():.1%} wszystkich użytkowników)"]
+
+    numeric_features = [feature for feature in features if feature in numeric_columns]
+    if numeric_features:
+        lines.append(NUMERIC_HEADER)
+        lines.extend(feature_line(stats, group, feature) for feature in numeric_features)
+
+    categorical_features = [feature for feature in features if feature in stats["categorical"]]
+    if categorical_features:
+        lines.append(CATEGORICAL_HEADER)
+        lines.extend(feature_line(stats, group, feature) for feature in categorical_features)
+
+    return "\n".join(lines)
+
+
+def compact_features(stats: dict, group, token_budget: int) -> list:
+    """
+    Cechy najmocniej odróżniające grupę od ogółu, dobierane zachłannie tak,
+    by profil zmieścił się w budżecie tokenów (co najmniej jedna cecha).
+    """
+    ranked = stats["scores"].loc[group].sort_values(ascending=False, kind="stable").index
+    used_tokens = sum(estimate_tokens(text) for text in (format_group_profile(stats, group, features=[]), NUMERIC_HEADER, CATEGORICAL_HEADER))
+    selected = []
+    for feature in ranked:
+        line_tokens = estimate_tokens(feature_line(stats, group, feature))
+        if selected and used_tokens + line_tokens > token_budget:
+            continue
+        selected.append(feature)
+        used_tokens += line_tokens
+    return selected
+
+
+def profile_groups(clustered_df: pd.DataFrame, group_column: str = GROUP_COLUMN, groups=None, token_budget: int = PROFILE_TOKEN_BUDGET):
+    """
+    Zwraca ({grupa: tekstowy profil}, raport) dla wybranych (domyślnie wszystkich) grup.
+    Przy token_budget profile zawierają tylko najbardziej informatywne cechy, a raport podaje
+    szacowaną liczbę tokenów pełnych i skróconych profili.
+    """
+    stats = group_statistics(clustered_df, group_column)
+    groups = stats["sizes"].index if groups is None else groups
+
+    profiles, tokens_full, features_kept = {}, 0, 0
+    for group in groups:
+        full_profile = format_group_profile(stats, group)
+        tokens_full += estimate_tokens(full_profile)
+
+        if token_budget and estimate_tokens(full_profile) > token_budget:
+            features = compact_features(stats, group, token_budget)
+            profiles[group] = format_group_profile(stats, group, features=features)
+            features_kept += len(features)
+        else:
+            profiles[group] = full_profile
+            features_kept += stats["scores"].shape[1]
+
+    tokens_compact = sum(estimate_tokens(profile) for profile in profiles.values())
+    report = {
+        "groups": len(profiles),
+        "features": stats["scores"].shape[1],
+        "features_kept": features_kept / len(profiles) if profiles else 0,
+        "tokens_full": tokens_full,
+        "tokens_compact": tokens_compact,
+        "tokens_saved": tokens_full - tokens_compact
+    }
+    return profiles, report
@@ -0,0 +1,161 @@
+# PROJECTS - zapisywanie i wczytywanie projektów segmentacji (model, przypisania, teksty)
+import json
+import os
+import re
+from datetime import datetime
+from functools import cached_property
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from clustering import GROUP_COLUMN, FittedPipeline
+from ingestion import PYARROW_AVAILABLE
+from openai_pool import api_key_hash
+
+PROJECTS_DIR = os.getenv("ZAPLANUJ_PROJECTS_DIR", "projects")
+
+META_FILE = "meta.json"
+TEXTS_FILE = "texts.json"
+MODEL_FILE = "model.joblib"
+HASHES_FILE = "row_hashes.npy"
+# Feather (pyarrow) czyta kolumny bez parsowania; bez pyarrow przypisania zapisywane są jako pickle
+ASSIGNMENTS_FILE = "assignments.feather" if PYARROW_AVAILABLE else "assignments.pkl"
+
+
+def project_id_from_name(name: str) -> str:
+    """Identyfikator projektu (nazwa katalogu) z nazwy podanej przez użytkownika"""
+    return re.sub(r"[^\w\-]+", "_", name.strip()).strip("_").lower()
+
+
+def user_projects_dir(api_key: str, projects_dir: str = PROJECTS_DIR) -> str:
+    """Katalog projektów jednego użytkownika (podkatalog nazwany skrótem klucza API) - sesje nie widzą cudzych projektów"""
+    return os.path.join(projects_dir, api_key_hash(api_key))
+
+
+def project_exists(project_id: str, projects_dir: str = PROJECTS_DIR) -> bool:
+    return os.path.exists(os.path.join(projects_dir, project_id, META_FILE))
+
+
+def _write_atomic(path: str, write):
+    """Zapisuje plik przez write(ścieżka tymczasowa) i podmienia go jednym os.replace"""
+    tmp_path = f"{path}.part"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def save_project(project_id: str, experiment, model, clustered_df: pd.DataFrame, row_hashes: np.ndarray, texts: dict,
+                 num_groups: int, campaign_goal: str = "", name: str = None, projects_dir: str = PROJECTS_DIR) -> str:
+    """
+    Zapisuje projekt w katalogu projects_dir/project_id: przypisania (Feather), pipeline i model (joblib),
+    skróty wierszy (npy) i teksty grup (JSON; texts: {grupa: {"name", "description", "campaign"}}).
+    meta.json zapisywany jest na końcu, więc przerwany zapis nie nadpisuje poprawnego projektu.
+    """
+    path = os.path.join(projects_dir, project_id)
+    os.makedirs(path, exist_ok=True)
+
+    assignments = clustered_df.reset_index(drop=True)
+    if PYARROW_AVAILABLE:
+        # Bez kompresji (domyślnie lz4) - tylko wtedy read_feather(memory_map=True) czyta kolumny bez kopiowania do pamięci
+        _write_atomic(os.path.join(path, ASSIGNMENTS_FILE), lambda tmp: assignments.to_feather(tmp, compression="uncompressed"))
+    else:
+        _write_atomic(os.path.join(path, ASSIGNMENTS_FILE), lambda tmp: assignments.to_pickle(tmp, compression=None))
+
+    pipeline = experiment.get_config("pipeline")
+    _write_atomic(os.path.join(path, MODEL_FILE), lambda tmp: joblib.dump({"pipeline": pipeline, "model": model}, tmp))
+
+    def write_hashes(tmp):
+        with open(tmp, "wb") as f:
+            np.save(f, np.asarray(row_hashes))
+    _write_atomic(os.path.join(path, HASHES_FILE), write_hashes)
+
+    def write_json(data):
+        def write(tmp):
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+        return write
+
+    _write_atomic(os.path.join(path, TEXTS_FILE), write_json(texts))
+    _write_atomic(os.path.join(path, META_FILE), write_json({
+        "project_id": project_id,
+        "name": name or project_id,
+        "saved_at": datetime.now().isoformat(timespec="seconds"),
+        "num_groups": int(num_groups),
+        "campaign_goal": campaign_goal,
+        "rows": len(assignments),
+        "columns": [str(column) for column in assignments.columns if column != GROUP_COLUMN],
+        "assignments_file": ASSIGNMENTS_FILE
+    }))
+    return path
+
+
+def list_projects(projects_dir: str = PROJECTS_DIR) -> list:
+    """Metadane zapisanych projektów, od najnowszego (czytane są tylko pliki meta.json)"""
+    if not os.path.isdir(projects_dir):
+        return []
+
+    projects = []
+    for entry in os.scandir(projects_dir):
+        meta_path = os.path.join(entry.path, META_FILE)
+        if entry.is_dir() and os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                projects.append(json.load(f))
+    return sorted(projects, key=lambda meta: meta["saved_at"], reverse=True)
+
+
+class Project:
+    """Zapisany projekt - każda część wczytywana jest z dysku dopiero przy pierwszym użyciu"""
+
+    def __init__(self, project_id: str, projects_dir: str = PROJECTS_DIR):
+        self.project_id = project_id
+        self.path = os.path.join(projects_dir, project_id)
+        with open(os.path.join(self.path, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+    @property
+    def saved_at(self) -> str:
+        return self.meta["saved_at"]
+
+    def _read_assignments(self, columns: list = None) -> pd.DataFrame:
+        path = os.path.join(self.path, self.meta["assignments_file"])
+        if path.endswith(".feather"):
+            from pyarrow import feather
+            return feather.read_feather(path, columns=columns, memory_map=True)
+        df = pd.read_pickle(path)
+        return df if columns is None else df[columns]
+
+    @cached_property
+    def data(self) -> pd.DataFrame:
+        """Dane źródłowe (przypisania bez kolumny z grupą)"""
+        return self._read_assignments(self.meta["columns"])
+
+    @cached_property
+    def clustered_df(self) -> pd.DataFrame:
+        """Dane z grupami - kolumny współdzielone z data, doczytywana jest tylko kolumna grupy"""
+        groups = self._read_assignments([GROUP_COLUMN])[GROUP_COLUMN]
+        if not isinstance(groups.dtype, pd.CategoricalDtype):
+            # Projekty zapisane przed zmianą typu kolumny trzymały nazwy grup jako tekst
+            groups = groups.astype("category")
+        return pd.concat([self.data, groups.set_axis(self.data.index)], axis=1, copy=False)
+
+    @cached_property
+    def row_hashes(self) -> np.ndarray:
+        # Mapowanie pamięci - skróty czytane są z dysku dopiero przy porównaniu z nowymi danymi
+        return np.load(os.path.join(self.path, HASHES_FILE), mmap_mode="r")
+
+    @cached_property
+    def _fitted(self) -> dict:
+        return joblib.load(os.path.join(self.path, MODEL_FILE))
+
+    @property
+    def experiment(self) -> FittedPipeline:
+        return FittedPipeline(self._fitted["pipeline"])
+
+    @property
+    def model(self):
+        return self._fitted["model"]
+
+    @cached_property
+    def texts(self) -> dict:
+        with open(os.path.join(self.path, TEXTS_FILE), encoding="utf-8") as f:
+            return json.load(f)
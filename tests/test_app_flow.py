@@ -0,0 +1,78 @@
+# Scenariusz Generatora na lokalnym serwerze fake_openai: wklejone dane -> grupy i kampanie -> PDF, eksport, zapis projektu
+import os
+import sys
+
+import numpy as np
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import llm_cache  # noqa: E402
+import projects  # noqa: E402
+import streamlit_option_menu  # noqa: E402
+from fake_openai import FakeOpenAIServer  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def fake_server():
+    """Jeden serwer na moduł - klienci OpenAI z puli procesu zapamiętują adres API"""
+    server = FakeOpenAIServer().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def generator(fake_server, tmp_path, monkeypatch):
+    """AppTest na stronie Generatora z wklejonymi danymi (3 grupy), bez cache LLM i z projektami w tmp_path"""
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setenv("OPENAI_BASE_URL", fake_server.base_url)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(streamlit_option_menu, "option_menu", lambda *args, **kwargs: "Generator")
+    user_projects_dir = projects.user_projects_dir
+    monkeypatch.setattr(projects, "user_projects_dir", lambda api_key: user_projects_dir(api_key, str(tmp_path)))
+
+    rng = np.random.default_rng(0)
+    rows = ["wiek,dochod,miasto"] + [
+        f"{rng.integers(18, 80)},{rng.integers(2000, 20000)},{rng.choice(['A', 'B', 'C'])}" for _ in range(300)
+    ]
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=300)
+    at.session_state["openai_api_key"] = "sk-test"
+    at.session_state["start_generation"] = True
+    at.run()
+    at.sidebar.radio[0].set_value("📋 Wklej dane ręcznie").run()
+    at.text_area[0].set_value("\n".join(rows))
+    at.sidebar.number_input[0].set_value(3)
+    at.sidebar.text_area[0].set_value("zwiększenie sprzedaży")
+    button(at, "Wczytaj dane").click().run()
+    assert not at.exception
+    return at
+
+
+def button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+def test_pdf_after_rerun(generator):
+    # "Przygotuj PDF" wywołuje rerun bez kliknięcia "Wczytaj dane" - wklejone dane muszą zostać w sesji
+    next(b for b in generator.button if b.label == "📄 Przygotuj PDF").click().run()
+    assert not generator.exception
+    assert [d for d in generator.get("download_button") if d.proto.label == "📥 Pobierz kampanię jako PDF"]
+
+
+def test_bulk_export_after_rerun(generator):
+    button(generator, "📦 Przygotuj eksport zbiorczy").click().run()
+    assert not generator.exception
+    labels = [d.proto.label for d in generator.get("download_button")]
+    assert "🗜️ Pobierz ZIP (PDF każdej grupy + CSV z danymi)" in labels
+
+
+def test_save_project(generator, tmp_path):
+    next(t for t in generator.text_input if t.label == "Nazwa projektu").set_value("Klienci Q3").run()
+    button(generator, "💾 Zapisz projekt").click().run()
+    assert not generator.exception
+    assert [s.value for s in generator.success][-1] == "✅ Zapisano projekt „Klienci Q3”."
+    assert projects.list_projects(projects.user_projects_dir("sk-test"))[0]["project_id"] == "klienci_q3"
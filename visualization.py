@@ -0,0 +1,98 @@
+# VISUALIZATION - wykresy grup docelowych (rzut PCA z próbkowaniem, liczebności grup)
+import hashlib
+import os
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA
+
+from clustering import GROUP_COLUMN, group_labels, nearest_centroid
+
+# Powyżej tylu punktów wykres pokazuje próbkę (każda grupa proporcjonalnie, małe grupy nie znikają)
+VIS_MAX_POINTS = int(os.getenv("ZAPLANUJ_VIS_MAX_POINTS", "5000"))
+MIN_POINTS_PER_GROUP = 50
+
+
+def model_fingerprint(model) -> str:
+    """Skrót dopasowanego modelu (centroidy i liczba etykiet) - klucz cache wykresów"""
+    hasher = hashlib.sha256(np.ascontiguousarray(model.cluster_centers_, dtype=np.float64).tobytes())
+    hasher.update(str(len(getattr(model, "labels_", []))).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def downsample_by_group(labels: np.ndarray, max_points: int, seed: int = 0) -> np.ndarray:
+    """Pozycje punktów do wykresu: najwyżej ok. max_points, z każdej grupy proporcjonalnie (min. MIN_POINTS_PER_GROUP)"""
+    if len(labels) <= max_points:
+        return np.arange(len(labels))
+
+    rng = np.random.default_rng(seed)
+    fraction = max_points / len(labels)
+    positions = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        take = min(len(members), max(MIN_POINTS_PER_GROUP, int(round(len(members) * fraction))))
+        positions.append(rng.choice(members, size=take, replace=False))
+    return np.sort(np.concatenate(positions))
+
+
+def cluster_projection(experiment, model, max_points: int = VIS_MAX_POINTS, seed: int = 0):
+    """
+    Dane treningowe rzutowane na dwie główne składowe (PCA) z grupą każdego punktu.
+    Punkty są najpierw próbkowane, więc koszt PCA i rozmiar wykresu nie rosną z liczbą wierszy.
+    Zwraca (DataFrame z kolumnami "PCA 1", "PCA 2" i grupą, liczba wszystkich punktów).
+    """
+    X = np.asarray(experiment.get_config("X_train_transformed"), dtype=np.float64)
+    labels = getattr(model, "labels_", None)
+    if labels is None or len(labels) != len(X):
+        labels = nearest_centroid(X, np.asarray(model.cluster_centers_, dtype=np.float64))
+
+    total_points = len(X)
+    positions = downsample_by_group(np.asarray(labels), max_points, seed=seed)
+    X, labels = X[positions], np.asarray(labels)[positions]
+
+    components = min(2, X.shape[1], len(X))
+    points = PCA(n_components=components, random_state=seed).fit_transform(X) if components else np.zeros((len(X), 0))
+    projection = pd.DataFrame({
+        "PCA 1": points[:, 0] if components > 0 else 0.0,
+        "PCA 2": points[:, 1] if components > 1 else 0.0,
+        GROUP_COLUMN: group_labels(labels, len(model.cluster_centers_))
+    })
+    return projection, total_points
+
+
+def cluster_scatter(projection: pd.DataFrame, total_points: int):
+    """Interaktywny wykres rozrzutu grup (plotly importowany dopiero tutaj)"""
+    import plotly.express as px
+
+    title = "Grupy docelowe (rzut PCA)"
+    if total_points > len(projection):
+        title += f" – próbka {len(projection)} z {total_points} punktów"
+    fig = px.scatter(
+        projection.sort_values(GROUP_COLUMN, kind="stable"),
+        x="PCA 1",
+        y="PCA 2",
+        color=GROUP_COLUMN,
+        title=title,
+        render_mode="webgl"
+    )
+    fig.update_traces(marker={"size": 5, "opacity": 0.7})
+    return fig
+
+
+def group_sizes_png(sizes: dict) -> bytes:
+    """Wykres słupkowy liczebności grup jako PNG (obiektowe API matplotlib - bez globalnego stanu pyplot)"""
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(8, 5))
+    ax = fig.subplots()
+    ax.bar([str(group) for group in sizes], list(sizes.values()), color='skyblue', edgecolor='black')
+    ax.set_title('Liczba użytkowników w grupach')
+    ax.set_xlabel('Grupa docelowa')
+    ax.set_ylabel('Liczba użytkowników')
+    ax.tick_params(axis='x', rotation=90)
+    fig.tight_layout()
+
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png", dpi=100)
+    return buffer.getvalue()